@@ -0,0 +1,146 @@
+"""Dense vs sparse Jacobians on a synthetic 300-species cascade.
+
+The cascade chains 100 copies of the MKK module of mapk_cascade: in every
+layer, X is phosphorylated twice by the doubly phosphorylated form of the
+layer above and dephosphorylated back. The first layer is phosphorylated by
+the constant kinase of MKKK in mapk_cascade and inhibited by the last layer,
+like MKKK by MAPK_PP. Each rate law involves at most three species, so the
+Jacobian has about 1% nonzero entries.
+
+Usage
+-----
+    $ python benchmarks/sparse_jacobian.py
+"""
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import identity
+from scipy.sparse.linalg import splu
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from biomass.models.mapk_cascade import C, param_values
+from biomass.solver import ParameterSet, get_jacobian, solve_ode
+
+
+class Cascade(object):
+    n_layers = 100
+    n_species = 3 * n_layers
+    n_reactions = 4 * n_layers
+    breakpoints = ()
+
+    def __init__(self):
+        self.perturbation = {}
+        self._v = np.zeros(self.n_reactions+1)
+        self._stoichiometric_matrix = self.stoichiometry(None)
+
+    def flux(self, t, y, x, v):
+        for l in range(self.n_layers):
+            (X, X_P, X_PP) = y[3*l:3*l+3]
+            if l == 0:
+                inhibition = 1 + (y[-1] / x[C.KI])**x[C.n]
+                v[1] = x[C.V1] * X / (inhibition * (x[C.K1] + X))
+                v[2] = x[C.V1] * X_P / (inhibition * (x[C.K1] + X_P))
+            else:
+                kinase = y[3*l-1]
+                v[4*l+1] = x[C.k3] * kinase * X / (x[C.K3] + X)
+                v[4*l+2] = x[C.k4] * kinase * X_P / (x[C.K4] + X_P)
+            v[4*l+3] = x[C.V5] * X_PP / (x[C.K5] + X_PP)
+            v[4*l+4] = x[C.V6] * X_P / (x[C.K6] + X_P)
+
+        return v
+
+    def stoichiometry(self, x):
+        S = np.zeros((self.n_species, self.n_reactions+1))
+        for l in range(self.n_layers):
+            r = 4 * l
+            S[3*l, [r+1, r+4]] = [-1, 1]
+            S[3*l+1, [r+1, r+2, r+3, r+4]] = [1, -1, 1, -1]
+            S[3*l+2, [r+2, r+3]] = [1, -1]
+
+        return S
+
+    def diffeq(self, t, y, x):
+        return self._stoichiometric_matrix.dot(self.flux(t, y, x, self._v))
+
+
+def _best_of(func, n_repeat):
+    elapsed = []
+    for _ in range(n_repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed.append(time.perf_counter() - start)
+
+    return min(elapsed), result
+
+
+def main():
+    warnings.filterwarnings('ignore')
+    cascade = Cascade()
+    x = ParameterSet(param_values(), cascade.stoichiometry(None))
+    y0 = np.full(cascade.n_species, 300.)
+    y0[1::3] = 0.
+    y0[2::3] = 0.
+    tspan = range(0, 3601, 60)
+
+    start = time.perf_counter()
+    dense = get_jacobian(cascade, cascade.n_species, C.NUM)
+    sparse = get_jacobian(cascade, cascade.n_species, C.NUM, sparse=True)
+    print(
+        '{:d} species, {:d} reactions, {:d} nonzero entries of J ({:.1%}); '
+        'derived in {:.1f} s\n'.format(
+            cascade.n_species, cascade.n_reactions, sparse.sparsity.nnz,
+            sparse.sparsity.nnz / cascade.n_species**2,
+            time.perf_counter() - start
+        )
+    )
+
+    # Linear algebra of an implicit step: evaluate J, factorize I - h*J and
+    # solve, as the stiff integrators do.
+    (_, Y) = solve_ode(cascade.diffeq, y0, [0, 600], x, jac=dense)
+    (y, h, b) = (Y[-1], 1., np.ones(cascade.n_species))
+    I_dense = np.eye(cascade.n_species)
+    I_sparse = identity(cascade.n_species, format='csc')
+    (t_dense, u_dense) = _best_of(
+        lambda: lu_solve(lu_factor(I_dense - h * dense(0., y, x)), b), 20
+    )
+    (t_sparse, u_sparse) = _best_of(
+        lambda: splu((I_sparse - h * sparse(0., y, x)).tocsc()).solve(b), 20
+    )
+    print('Jacobian + LU + solve')
+    print('  dense : {:8.2f} ms'.format(t_dense * 1e3))
+    print(
+        '  sparse: {:8.2f} ms (max deviation {:.1e})\n'.format(
+            t_sparse * 1e3, np.max(np.abs(u_sparse - u_dense))
+        )
+    )
+
+    (_, reference) = solve_ode(
+        cascade.diffeq, y0, tspan, x, jac=dense, rtol=1e-12, atol=1e-12,
+        min_step=0.
+    )
+    scale = np.maximum(np.max(np.abs(reference), axis=0), 1e-12)
+    print('Integration over {:d} s'.format(tspan[-1]))
+    for (method, jac) in [
+            ('lsoda', dense), ('bdf', dense), ('bdf', sparse),
+            ('radau', dense), ('radau', sparse)]:
+        (elapsed, (T, Y)) = _best_of(
+            lambda: solve_ode(
+                cascade.diffeq, y0, tspan, x, jac=jac, method=method
+            ), 1
+        )
+        error = np.max(np.abs(Y - reference) / scale) \
+            if T[-1] == tspan[-1] else np.nan
+        print(
+            '  {:<6s}{:<7s}: {:8.2f} s (error {:.1e})'.format(
+                method, 'sparse' if jac.sparse else 'dense', elapsed, error
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -61,31 +61,26 @@ class InitialConditionSensitivity(ExecModel):
         )
         for i, nth_paramset in enumerate(n_file):
             (x, y0) = self.load_param(nth_paramset)
-            y_init = y0[:]
-            for j, idx in enumerate(nonzero_indices):
-                y0 = y_init[:]
-                y0[idx] = y_init[idx] * rate
-                if self.sim.simulate(x, y0) is None:
-                    for k, _ in enumerate(self.obs):
-                        for l, _ in enumerate(self.sim.conditions):
-                            signaling_metric[i, j, k, l] = \
-                                get_signaling_metric(
-                                    metric, self.sim.simulations[k, :, l]
-                                )
-                sys.stdout.write(
-                    '\r{:d} / {:d}'.format(
-                        i*len(nonzero_indices)+j+1,
-                        len(n_file)*len(nonzero_indices)
-                    )
-                )
-            # Signaling metric without perturbation (j=-1)
-            y0 = y_init[:]
-            if self.sim.simulate(x, y0) is None:
+            # One perturbed initial condition per index, and the one without
+            # perturbation (j=-1), simulated as an ensemble.
+            Y0 = np.tile(
+                np.asarray(y0, dtype=float), (len(nonzero_indices)+1, 1)
+            )
+            Y0[range(len(nonzero_indices)), nonzero_indices] *= rate
+            simulations = self.sim.simulate_ensemble(
+                np.tile(x, (len(Y0), 1)), Y0
+            )
+            for j in range(len(nonzero_indices)+1):
+                if np.any(np.isnan(simulations[j])):
+                    continue  # Simulation failed
                 for k, _ in enumerate(self.obs):
                     for l, _ in enumerate(self.sim.conditions):
-                        signaling_metric[i, -1, k, l] = get_signaling_metric(
-                            metric, self.sim.simulations[k, :, l]
+                        signaling_metric[i, j, k, l] = get_signaling_metric(
+                            metric, simulations[j, k, :, l]
                         )
+            sys.stdout.write(
+                '\r{:d} / {:d}'.format(i+1, len(n_file))
+            )
         sensitivity_coefficients = dlnyi_dlnxj(
             signaling_metric, n_file, nonzero_indices,
             self.obs, self.sim.conditions, rate
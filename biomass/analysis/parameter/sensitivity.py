@@ -62,31 +62,22 @@ class ParameterSensitivity(ExecModel):
         )
         for i, nth_paramset in enumerate(n_file):
             (x, y0) = self.load_param(nth_paramset)
-            x_init = x[:]
-            for j, idx in enumerate(param_indices):
-                x = x_init[:]
-                x[idx] = x_init[idx] * rate
-                if self.sim.simulate(x, y0) is None:
-                    for k, _ in enumerate(self.obs):
-                        for l, _ in enumerate(self.sim.conditions):
-                            signaling_metric[i, j, k, l] = \
-                                get_signaling_metric(
-                                    metric, self.sim.simulations[k, :, l]
-                                )
-                sys.stdout.write(
-                    '\r{:d} / {:d}'.format(
-                        i*len(param_indices)+j+1,
-                        len(n_file)*len(param_indices)
-                    )
-                )
-            # Signaling metric without perturbation (j=-1)
-            x = x_init[:]
-            if self.sim.simulate(x, y0) is None:
+            # One perturbed parameter set per index, and the set without
+            # perturbation (j=-1), simulated as an ensemble.
+            X = np.tile(np.asarray(x, dtype=float), (len(param_indices)+1, 1))
+            X[range(len(param_indices)), param_indices] *= rate
+            simulations = self.sim.simulate_ensemble(X, y0)
+            for j in range(len(param_indices)+1):
+                if np.any(np.isnan(simulations[j])):
+                    continue  # Simulation failed
                 for k, _ in enumerate(self.obs):
                     for l, _ in enumerate(self.sim.conditions):
-                        signaling_metric[i, -1, k, l] = get_signaling_metric(
-                            metric, self.sim.simulations[k, :, l]
+                        signaling_metric[i, j, k, l] = get_signaling_metric(
+                            metric, simulations[j, k, :, l]
                         )
+            sys.stdout.write(
+                '\r{:d} / {:d}'.format(i+1, len(n_file))
+            )
         sensitivity_coefficients = dlnyi_dlnxj(
             signaling_metric, n_file, param_indices,
             self.obs, self.sim.conditions, rate
@@ -1,4 +1,3 @@
-import os
 import numpy as np
 
 from .temporal_dynamics import TemporalDynamics
@@ -44,21 +43,19 @@ class SignalingSystems(TemporalDynamics):
             if len(n_file) > 0:
                 if len(n_file) == 1 and viz_type == 'average':
                     viz_type = 'best'
+                (X, Y0) = zip(
+                    *[self.load_param(nth_paramset) for nth_paramset in n_file]
+                )
+                simulations = self.sim.simulate_ensemble(X, Y0)
                 for i, nth_paramset in enumerate(n_file):
-                    (dynamic, successful) = self._validate(nth_paramset)
-                    if successful:
-                        for j, _ in enumerate(self.obs):
-                            simulations_all[j, i, :, :] = \
-                                dynamic.simulations[j, :, :]
-                best_fitness_all = np.full(len(n_file), np.inf)
-                for i, nth_paramset in enumerate(n_file):
-                    if os.path.isfile(
-                            self.model_path
-                            + '/out/{:d}/best_fitness.npy'.format(nth_paramset)):
-                        best_fitness_all[i] = np.load(
-                            self.model_path
-                            + '/out/{:d}/best_fitness.npy'.format(nth_paramset)
+                    if np.any(np.isnan(simulations[i])):
+                        print(
+                            'Simulation failed. #{:d}\n'.format(nth_paramset)
                         )
+                    else:
+                        simulations_all[:, i, :, :] = simulations[i]
+                dynamic = self.sim
+                (_, popt, best_fitness_all) = self.results.get_all()
                 best_paramset = n_file[np.argmin(best_fitness_all)]
                 self._write_best_fit_param(best_paramset)
                 if viz_type == 'average':
@@ -69,11 +66,6 @@ class SignalingSystems(TemporalDynamics):
                     dynamic, _ = self._validate(int(viz_type))
 
                 if 2 <= len(n_file):
-                    popt = np.empty((len(n_file), 
-                        len(self.sp.idx_params) + len(self.sp.idx_initials))
-                    )
-                    for i, nth_paramset in enumerate(n_file):
-                        popt[i, :] = self.get_indiv(nth_paramset)
                     self.plot_param_range(popt, portrait=True)
             else:
                 x = self.pval()
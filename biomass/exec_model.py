@@ -1,6 +1,4 @@
-import os
-import re
-import numpy as np
+from biomass.result_store import ResultStore
 
 class ExecModel(object):
     def __init__(self, model):
@@ -16,18 +14,11 @@ class ExecModel(object):
         self.rxn = model.ReactionNetwork()
         self.sp = model.SearchParam()
         self.obj_func = model.objective
+        self.results = ResultStore(self.model_path + '/out')
 
     def get_indiv(self, paramset):
-        best_generation = np.load(
-            self.model_path + '/out/{:d}/generation.npy'.format(
-                paramset
-            )
-        )
-        best_indiv = np.load(
-            self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                paramset, int(best_generation)
-            )
-        )
+        best_indiv = self.results.get_indiv(paramset)
+
         return best_indiv
 
     def load_param(self, paramset):
@@ -36,18 +27,6 @@ class ExecModel(object):
         return x, y0
 
     def get_executable(self):
-        n_file = []
-        fitparam_files = os.listdir(self.model_path + '/out')
-        for file in fitparam_files:
-            if re.match(r'\d', file):
-                n_file.append(int(file))
-        empty_folder = []
-        for i, nth_paramset in enumerate(n_file):
-            if not os.path.isfile(
-                    self.model_path 
-                    + '/out/{:d}/generation.npy'.format(nth_paramset)):
-                empty_folder.append(i)
-        for i in sorted(empty_folder, reverse=True):
-            n_file.pop(i)
-        
-        return n_file
\ No newline at end of file
+        n_file = self.results.get_executable()
+
+        return n_file
@@ -1,2 +1,5 @@
 from .ga_init import GeneticAlgorithmInit
-from .ga_continue import GeneticAlgorithmContinue
\ No newline at end of file
+from .ga_continue import GeneticAlgorithmContinue
+from .evaluator import Evaluator, FitnessCache
+from .migration import Migration
+from .population import Population
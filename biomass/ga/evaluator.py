@@ -0,0 +1,418 @@
+import multiprocessing
+import queue
+from collections import OrderedDict
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+
+class Evaluator(object):
+    """ Evaluate the objective function for a batch of individuals at once.
+
+    Parameters
+    ----------
+    obj_func : callable
+        obj_func(indiv_gene) -> float.
+        If backend is 'vectorized', obj_func(genes) -> numpy array of shape
+        (n_indiv,) for genes of shape (n_indiv, n_gene).
+        NaN means that the simulation was aborted by the budget; the
+        individual is counted in n_aborted and is infeasible (inf) like one
+        whose simulation failed.
+
+    backend : str
+        - 'serial': Evaluate individuals one by one in this process.
+        - 'process': Distribute individuals over a process pool.
+        - 'thread': Distribute individuals over a thread pool.
+        - 'vectorized': Pass the whole batch to obj_func.
+
+    n_workers : int, optional
+        Size of the pool. Default: cpu_count - 1.
+
+    tolerance_schedule : list of dict, optional
+        Solver options of the low-fidelity evaluations in screen, loosest
+        first, e.g., [{'rtol': 1e-6, 'atol': 1e-6}]. They are passed to
+        obj_func as the keyword argument solver_options.
+
+    budget : dict, optional
+        Limits of every simulation, passed to obj_func along with the
+        solver options, e.g., {'max_time': 10., 'check_finite': True} (see
+        biomass.solver.solve_ode).
+
+    cache : dict, optional
+        Keyword arguments of FitnessCache, e.g., {'maxsize': 10000}. If
+        given, objective values at full accuracy are looked up before the
+        individuals are evaluated.
+
+    Attributes
+    ----------
+    n_screened : int
+        Number of individuals evaluated by screen.
+
+    n_exact : int
+        Number of them that were evaluated at full accuracy.
+
+    n_aborted : int
+        Number of evaluations aborted by the budget.
+
+    cache : FitnessCache or None
+
+    Notes
+    -----
+    scipy's odeint is not reentrant, so simulations run one at a time under
+    the 'thread' backend; it pays off only for objectives that release the
+    GIL elsewhere.
+    The pool is created on the first call, i.e., in the process that runs the
+    GA, and is not pickled along with the Evaluator.
+    A process pool cannot be created inside a daemonic process, e.g., a
+    worker of the multiprocessing.Pool used to run paramsets in parallel.
+    """
+    backends = ['serial', 'process', 'thread', 'vectorized']
+
+    def __init__(self, obj_func, backend='serial', n_workers=None,
+                 tolerance_schedule=None, budget=None, cache=None):
+        if backend not in self.backends:
+            raise ValueError(
+                "Available backends are: '" + "', '".join(self.backends) + "'"
+            )
+        self.obj_func = obj_func
+        self.backend = backend
+        self.n_workers = max(1, multiprocessing.cpu_count() - 1) \
+            if n_workers is None else n_workers
+        self.tolerance_schedule = [] if tolerance_schedule is None \
+            else list(tolerance_schedule)
+        self.budget = {} if budget is None else dict(budget)
+        self.n_screened = 0
+        self.n_exact = 0
+        self.n_aborted = 0
+        self.cache = None if cache is None else FitnessCache(**cache)
+        self._pool = None
+
+    def __call__(self, genes, solver_options=None):
+        """
+        Parameters
+        ----------
+        genes : numpy array
+            (n_indiv, n_gene)
+
+        solver_options : dict, optional
+            Passed to obj_func. By default, individuals are evaluated at the
+            full accuracy of the solver.
+
+        Returns
+        -------
+        fitness : numpy array
+            (n_indiv,)
+
+        """
+        if self.cache is None or solver_options is not None:
+            return self._abort(self._evaluate(genes, solver_options))
+        fitness = np.empty(len(genes))
+        pending = OrderedDict()  # key -> indices of the individuals
+        for (i, indiv_gene) in enumerate(genes):
+            key = self.cache.key(indiv_gene)
+            value = self.cache.get(key)
+            if value is not None:
+                fitness[i] = value
+            else:
+                pending.setdefault(key, []).append(i)
+        self.cache.hits += len(genes) - len(pending)
+        self.cache.misses += len(pending)
+        if pending:
+            values = self._evaluate(
+                genes[[indices[0] for indices in pending.values()]]
+            )
+            for ((key, indices), value) in zip(pending.items(), values):
+                fitness[indices] = value
+                if not np.isnan(value):
+                    self.cache.put(key, value)
+
+        return self._abort(fitness)
+
+    def _evaluate(self, genes, solver_options=None):
+        obj_func = self._get_obj_func(solver_options)
+        if self.backend == 'serial':
+            fitness = [obj_func(indiv_gene) for indiv_gene in genes]
+        elif self.backend == 'vectorized':
+            fitness = obj_func(genes)
+        else:
+            fitness = self._get_pool().map(obj_func, genes)
+
+        return np.array(fitness, dtype=float)
+
+    def _get_obj_func(self, solver_options=None):
+        if self.budget:
+            solver_options = dict(self.budget, **(solver_options or {}))
+
+        return self.obj_func if solver_options is None \
+            else partial(self.obj_func, solver_options=solver_options)
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.backend == 'process':
+                self._pool = multiprocessing.Pool(processes=self.n_workers)
+            else:
+                self._pool = ThreadPool(processes=self.n_workers)
+
+        return self._pool
+
+    def _abort(self, fitness):
+        fitness = np.array(fitness, dtype=float)
+        aborted = np.isnan(fitness)
+        self.n_aborted += np.count_nonzero(aborted)
+        fitness[aborted] = np.inf
+
+        return fitness
+
+    def evaluate_async(self, propose, accept):
+        """ Keep all workers busy with individuals of variable cost.
+
+        Each worker evaluates one individual at a time. As soon as an
+        objective value arrives, it is passed to accept, and the worker is
+        given the next individual from propose, which may therefore depend
+        on all the values accepted so far. Under the 'serial' and
+        'vectorized' backends, individuals are evaluated one by one.
+
+        Parameters
+        ----------
+        propose : callable
+            propose() -> numpy array of genes of shape (n_gene,).
+
+        accept : callable
+            accept(indiv_gene, fitness) -> bool, called in the order of
+            arrival. True stops the evaluation; individuals that are still
+            being evaluated are discarded.
+
+        """
+        if self.backend in ['serial', 'vectorized']:
+            while True:
+                indiv_gene = propose()
+                if accept(indiv_gene, self(indiv_gene[np.newaxis, :])[0]):
+                    return
+        obj_func = self._get_obj_func()
+        pool = self._get_pool()
+        arrivals = queue.Queue()
+
+        def _submit():
+            """ Submit the next individual that is not in the cache. Returns
+            True if accept stopped the evaluation at a cached value.
+            """
+            while True:
+                indiv_gene = propose()
+                if self.cache is not None:
+                    fitness = self.cache.get(self.cache.key(indiv_gene))
+                    if fitness is not None:
+                        self.cache.hits += 1
+                        if accept(indiv_gene, fitness):
+                            return True
+                        continue
+                    self.cache.misses += 1
+                pool.apply_async(
+                    obj_func, (indiv_gene,),
+                    callback=lambda fitness: arrivals.put(
+                        (indiv_gene, fitness)
+                    ),
+                    error_callback=lambda error: arrivals.put(
+                        (indiv_gene, error)
+                    )
+                )
+                return False
+
+        for _ in range(self.n_workers):
+            if _submit():
+                return
+        while True:
+            (indiv_gene, fitness) = arrivals.get()
+            if isinstance(fitness, BaseException):
+                raise fitness
+            if self.cache is not None and not np.isnan(fitness):
+                self.cache.put(self.cache.key(indiv_gene), fitness)
+            if accept(indiv_gene, self._abort([fitness])[0]):
+                return
+            if _submit():
+                return
+
+    def screen(self, genes, threshold):
+        """ Multi-fidelity evaluation of individuals that only matter if they
+        are better than threshold, e.g., children competing for the place of
+        an elite.
+
+        The individuals are evaluated at each tolerance of
+        tolerance_schedule in turn, and only those better than threshold are
+        evaluated again at the next one and finally at full accuracy.
+        Without a schedule, all of them are evaluated at full accuracy.
+        Individuals found in the cache are not evaluated at all.
+
+        Parameters
+        ----------
+        genes : numpy array
+            (n_indiv, n_gene)
+
+        threshold : float
+
+        Returns
+        -------
+        fitness : numpy array
+            (n_indiv,), from the last evaluation of each individual.
+
+        exact : numpy array of bool
+            (n_indiv,), whether fitness is of full accuracy. If not, fitness
+            is not better than threshold at a lower fidelity.
+
+        """
+        fitness = np.full(len(genes), np.inf)
+        exact = np.zeros(len(genes), dtype=bool)
+        if self.cache is not None:
+            for (i, indiv_gene) in enumerate(genes):
+                value = self.cache.get(self.cache.key(indiv_gene))
+                if value is not None:
+                    fitness[i] = value
+                    exact[i] = True
+            self.cache.hits += np.count_nonzero(exact)
+        candidates = np.flatnonzero(~exact)
+        for solver_options in self.tolerance_schedule:
+            fitness[candidates] = self(genes[candidates], solver_options)
+            candidates = candidates[fitness[candidates] < threshold]
+        if self.cache is not None:
+            # The candidates left are looked up again below.
+            self.cache.misses += \
+                len(genes) - np.count_nonzero(exact) - len(candidates)
+        if len(candidates) > 0:
+            fitness[candidates] = self(genes[candidates])
+            exact[candidates] = True
+        self.n_screened += len(genes)
+        self.n_exact += len(candidates)
+
+        return fitness, exact
+
+    def sample(self, sampler, n_indiv, callback=None):
+        """ Draw individuals in batches until n_indiv of them have a finite
+        objective value.
+
+        Each batch is oversampled by the inverse of the acceptance rate
+        observed so far, so that infeasible samples are usually replaced
+        within the same batch.
+
+        Parameters
+        ----------
+        sampler : callable
+            sampler(n) -> numpy array of genes of shape (n, n_gene).
+
+        n_indiv : int
+            Number of feasible individuals.
+
+        callback : callable, optional
+            callback(n_accepted, n_rejected) is called after every batch.
+
+        Returns
+        -------
+        population : numpy array
+            (n_indiv, n_gene+1), the last column holds the objective values.
+
+        n_rejected : int
+            Number of infeasible samples.
+
+        """
+        population = None
+        n_accepted = 0
+        n_rejected = 0
+        while n_accepted < n_indiv:
+            n_remaining = n_indiv - n_accepted
+            acceptance_rate = 1. if n_accepted + n_rejected == 0 \
+                else max(n_accepted / (n_accepted + n_rejected), 0.1)
+            genes = sampler(int(np.ceil(n_remaining / acceptance_rate)))
+            fitness = self(genes)
+            feasible = np.isfinite(fitness)
+            if population is None:
+                population = np.full((n_indiv, genes.shape[1]+1), np.inf)
+            n_new = min(n_remaining, np.count_nonzero(feasible))
+            population[n_accepted:n_accepted+n_new, :-1] = \
+                genes[feasible][:n_new]
+            population[n_accepted:n_accepted+n_new, -1] = \
+                fitness[feasible][:n_new]
+            n_accepted += n_new
+            n_rejected += np.count_nonzero(~feasible)
+            if callback is not None:
+                callback(n_accepted, n_rejected)
+
+        return population, n_rejected
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None
+
+        return state
+
+
+class FitnessCache(object):
+    """ Bounded cache of objective values, keyed on the genes.
+
+    When the cache is full, the least recently used entry is replaced.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of objective values kept.
+
+    resolution : float, optional
+        Genes are rounded to multiples of resolution, so that individuals
+        closer than that share their objective value. By default, only
+        identical genes do, e.g., children clipped onto the same point of
+        the boundary of the search region.
+
+    Attributes
+    ----------
+    hits : int
+        Number of individuals whose objective value was found.
+
+    misses : int
+        Number of individuals that had to be evaluated.
+
+    """
+    def __init__(self, maxsize=10000, resolution=None):
+        if maxsize < 1:
+            raise ValueError('maxsize must be a positive integer')
+        if resolution is not None and not resolution > 0:
+            raise ValueError('resolution must be positive')
+        self.maxsize = maxsize
+        self.resolution = resolution
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def key(self, indiv_gene):
+        indiv_gene = np.asarray(indiv_gene, dtype=float)
+        if self.resolution is not None:
+            indiv_gene = np.round(indiv_gene / self.resolution)
+
+        return (indiv_gene + 0.).tobytes()  # -0. and 0. are the same gene.
+
+    def get(self, key):
+        value = self._values.get(key)
+        if value is not None:
+            self._values.move_to_end(key)
+
+        return value
+
+    def put(self, key, value):
+        self._values[key] = float(value)
+        self._values.move_to_end(key)
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def clear(self):
+        self._values.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        n_lookups = self.hits + self.misses
+
+        return self.hits / n_lookups if n_lookups > 0 else 0.
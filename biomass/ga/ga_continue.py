@@ -2,11 +2,18 @@ import time
 import numpy as np
 
 from biomass.exec_model import ExecModel
+from .evaluator import Evaluator
+from .population import Population
+from .recorder import RunRecorder
 from .rcga import (UnimodalNormalDistributionXover,
                    DistanceIndependentDiversityControl)
 
 class GeneticAlgorithmContinue(ExecModel):
-    def __init__(self, model, max_generation, allowable_error, p0_bounds):
+    def __init__(self, model, max_generation, allowable_error, p0_bounds,
+                 backend='serial', n_workers=None,
+                 flush_interval=100, flush_on_improvement=True,
+                 tolerance_schedule=None, budget=None, migration=None,
+                 asynchronous=False, cache=None):
         super().__init__(model)
         self.search_rgn = self.sp.get_region()
         self.n_population = int(5*self.search_rgn.shape[1])
@@ -14,6 +21,14 @@ class GeneticAlgorithmContinue(ExecModel):
         self.n_gene = self.search_rgn.shape[1]
         self.max_generation = max_generation
         self.allowable_error = allowable_error
+        self.evaluator = Evaluator(
+            self.obj_func, backend, n_workers, tolerance_schedule, budget,
+            cache
+        )
+        self.flush_interval = flush_interval
+        self.flush_on_improvement = flush_on_improvement
+        self.migration = migration
+        self.asynchronous = asynchronous
         self.p0_bounds = p0_bounds
 
         if self.n_population < self.n_gene + 2:
@@ -28,42 +43,84 @@ class GeneticAlgorithmContinue(ExecModel):
         np.random.seed(
             time.time_ns()*nth_paramset % 2**32
         )
-        (best_indiv, best_fitness) = self._ga_v2_continue(nth_paramset)
+        self.recorder = RunRecorder(
+            self.results, nth_paramset,
+            self.flush_interval, self.flush_on_improvement
+        )
+        self.evaluator.n_screened = 0
+        self.evaluator.n_exact = 0
+        self.evaluator.n_aborted = 0
+        if self.evaluator.cache is not None:
+            self.evaluator.cache.clear()
+        if self.migration is not None:
+            self.migration.n_immigrants = 0
+        try:
+            if self.asynchronous:
+                (best_indiv, best_fitness) = \
+                    self._ga_v3_continue(nth_paramset)
+            else:
+                (best_indiv, best_fitness) = \
+                    self._ga_v2_continue(nth_paramset)
+            if self.evaluator.tolerance_schedule:
+                self.recorder.log(
+                    'Evaluated {:d} of {:d} children at full accuracy\n'
+                    .format(self.evaluator.n_exact, self.evaluator.n_screened)
+                )
+            if self.evaluator.budget:
+                self.recorder.log(
+                    'Aborted {:d} simulations that exceeded the budget\n'
+                    .format(self.evaluator.n_aborted)
+                )
+            if self.migration is not None:
+                self.recorder.log(
+                    'Accepted {:d} immigrants from other paramsets\n'
+                    .format(self.migration.n_immigrants)
+                )
+            if self.evaluator.cache is not None:
+                self.recorder.log(
+                    'Found {:d} of {:d} objective values in the cache '
+                    '({:.1%})\n'.format(
+                        self.evaluator.cache.hits,
+                        self.evaluator.cache.hits
+                        + self.evaluator.cache.misses,
+                        self.evaluator.cache.hit_rate
+                    )
+                )
+        finally:
+            self.recorder.close()
+            self.evaluator.close()
 
     def _set_continue(self, nth_paramset):
-        best_generation = np.load(
-            self.model_path + '/out/{:d}/generation.npy'.format(nth_paramset)
+        best_indiv = self.get_indiv(nth_paramset)
+        self.recorder.log(
+            '\n########################################\n' +
+            '\n############### Continue ###############\n' +
+            '\n########################################\n' +
+            '\nGenerating the initial population. . .\n'
         )
-        best_indiv = np.load(
-            self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                nth_paramset, int(best_generation)
+
+        def _sampler(n):
+            genes = np.array(
+                [self._encode_bestIndivVal2randGene(best_indiv)
+                 for _ in range(n)]
+            )
+            return np.clip(genes, 0., 1.)
+
+        (population, n_rejected) = self.evaluator.sample(
+            _sampler, self.n_population,
+            lambda n_accepted, _: self.recorder.log(
+                '{:d} / {:d}\n'.format(n_accepted, self.n_population)
             )
         )
-        population = np.full((self.n_population, self.n_gene+1), np.inf)
-
-        with open(
-                self.model_path + '/out/{:d}/'
-                'optimization.log'.format(nth_paramset), mode='a') as f:
-            f.write(
-                '\n########################################\n' +
-                '\n############### Continue ###############\n' +
-                '\n########################################\n' +
-                '\nGenerating the initial population. . .\n'
+        self.recorder.log(
+            'Rejected {:d} infeasible samples\n'.format(n_rejected)
+        )
+        if self.evaluator.budget:
+            self.recorder.log(
+                'Aborted {:d} simulations that exceeded the budget\n'
+                .format(self.evaluator.n_aborted)
             )
-        for i in range(self.n_population):
-            while not np.isfinite(population[i, -1]):
-                population[i, :self.n_gene] = \
-                    self._encode_bestIndivVal2randGene(best_indiv)
-                population[i, :self.n_gene] = \
-                    np.clip(population[i, :self.n_gene], 0., 1.)
-                population[i, -1] = self.obj_func(population[i, :self.n_gene])
-            with open(
-                    self.model_path + '/out/{:d}/'
-                    'optimization.log'.format(nth_paramset), mode='a') as f:
-                f.write(
-                    '{:d} / {:d}\n'.format(i + 1, self.n_population)
-                )
-        population = population[np.argsort(population[:, -1]), :]
+        population = Population(population)
 
         return population
 
@@ -82,43 +139,27 @@ class GeneticAlgorithmContinue(ExecModel):
 
     def _ga_v1_continue(self, nth_paramset):
         undx = UnimodalNormalDistributionXover(
-            self.obj_func, self.n_population, self.n_children, self.n_gene
-        )
-        count_num = np.load(
-            self.model_path + '/out/{:d}/count_num.npy'.format(nth_paramset)
-        )
-        best_generation = np.load(
-            self.model_path + '/out/{:d}/generation.npy'.format(nth_paramset)
-        )
-        best_indiv = np.load(
-            self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                nth_paramset, int(best_generation)
-            )
+            self.obj_func, self.n_population, self.n_children, self.n_gene,
+            self.evaluator
         )
+        (best_indiv, _, _, count_num) = self.results.get(nth_paramset)
         best_indiv_gene = self.sp.val2gene(best_indiv)
-        best_fitness = self.obj_func(best_indiv_gene)
+        best_fitness = self.evaluator(best_indiv_gene[np.newaxis, :])[0]
 
         population = self._set_continue(nth_paramset)
         if best_fitness < population[0, -1]:
-            population[0, :self.n_gene] = best_indiv_gene
-            population[0, -1] = best_fitness
-        else:
-            best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-            best_fitness = population[0, -1]
-            np.save(
-                self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                    nth_paramset, int(count_num) + 1
-                ), best_indiv
-            )
-        with open(
-                self.model_path + '/out/{:d}/'
-                'optimization.log'.format(nth_paramset), mode='a') as f:
-            f.write(
-                '\n----------------------------------------\n\n' +
-                'Generation{:d}: Best Fitness = {:e}\n'.format(
-                    int(count_num) + 1, best_fitness
-                )
+            population.replace(0, np.append(best_indiv_gene, best_fitness))
+        self.recorder.log(
+            '\n----------------------------------------\n\n' +
+            'Generation{:d}: Best Fitness = {:e}\n'.format(
+                int(count_num) + 1, population[0, -1]
             )
+        )
+        self.recorder.record(
+            int(count_num) + 1,
+            self.sp.gene2val(population[0, :self.n_gene]),
+            population[0, -1]
+        )
         if population[0, -1] <= self.allowable_error:
             best_indiv = self.sp.gene2val(population[0, :self.n_gene])
             best_fitness = population[0, -1]
@@ -128,38 +169,16 @@ class GeneticAlgorithmContinue(ExecModel):
         generation = 1
         while generation < self.max_generation:
             population = undx.mgg_alternation(population)
-            best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-            if population[0, -1] < best_fitness:
-                np.save(
-                    self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                        nth_paramset, generation + int(count_num) + 1
-                    ), best_indiv
-                )
-                np.save(
-                    self.model_path + '/out/{:d}/generation.npy'.format(
-                        nth_paramset
-                    ), generation + int(count_num) + 1
-                )
-                np.save(
-                    self.model_path + '/out/{:d}/best_fitness'.format(
-                        nth_paramset
-                    ), best_fitness
+            self.recorder.log(
+                'Generation{:d}: Best Fitness = {:e}\n'.format(
+                    generation + int(count_num) + 1, population[0, -1]
                 )
-            best_fitness = population[0, -1]
-
-            np.save(
-                self.model_path + '/out/{:d}/count_num.npy'.format(
-                    nth_paramset
-                ), generation + int(count_num) + 1
             )
-            with open(
-                    self.model_path + '/out/{:d}/'
-                    'optimization.log'.format(nth_paramset), mode='a') as f:
-                f.write(
-                    'Generation{:d}: Best Fitness = {:e}\n'.format(
-                        generation + int(count_num) + 1, best_fitness
-                    )
-                )
+            self.recorder.record(
+                generation + int(count_num) + 1,
+                self.sp.gene2val(population[0, :self.n_gene]),
+                population[0, -1]
+            )
             if population[0, -1] <= self.allowable_error:
                 best_indiv = self.sp.gene2val(population[0, :self.n_gene])
                 best_fitness = population[0, -1]
@@ -175,46 +194,30 @@ class GeneticAlgorithmContinue(ExecModel):
 
     def _ga_v2_continue(self, nth_paramset):
         didc = DistanceIndependentDiversityControl(
-            self.obj_func, self.n_population, self.n_children, self.n_gene
+            self.obj_func, self.n_population, self.n_children, self.n_gene,
+            self.evaluator
         )
         n_iter = 1
         n0 = np.empty(3*self.n_population)
 
-        count_num = np.load(
-            self.model_path + '/out/{:d}/count_num.npy'.format(nth_paramset)
-        )
-        best_generation = np.load(
-            self.model_path + '/out/{:d}/generation.npy'.format(nth_paramset)
-        )
-        best_indiv = np.load(
-            self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                nth_paramset, int(best_generation)
-            )
-        )
+        (best_indiv, _, _, count_num) = self.results.get(nth_paramset)
         best_indiv_gene = self.sp.val2gene(best_indiv)
-        best_fitness = self.obj_func(best_indiv_gene)
+        best_fitness = self.evaluator(best_indiv_gene[np.newaxis, :])[0]
 
         population = self._set_continue(nth_paramset)
         if best_fitness < population[0, -1]:
-            population[0, :self.n_gene] = best_indiv_gene
-            population[0, -1] = best_fitness
-        else:
-            best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-            best_fitness = population[0, -1]
-            np.save(
-                self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                    nth_paramset, int(count_num) + 1
-                ), best_indiv
-            )
-        with open(
-                self.model_path + '/out/{:d}/'
-                'optimization.log'.format(nth_paramset), mode='a') as f:
-            f.write(
-                '\n----------------------------------------\n\n' +
-                'Generation{:d}: Best Fitness = {:e}\n'.format(
-                    int(count_num) + 1, best_fitness
-                )
+            population.replace(0, np.append(best_indiv_gene, best_fitness))
+        self.recorder.log(
+            '\n----------------------------------------\n\n' +
+            'Generation{:d}: Best Fitness = {:e}\n'.format(
+                int(count_num) + 1, population[0, -1]
             )
+        )
+        self.recorder.record(
+            int(count_num) + 1,
+            self.sp.gene2val(population[0, :self.n_gene]),
+            population[0, -1]
+        )
         n0[0] = population[0, -1]
 
         if population[0, -1] <= self.allowable_error:
@@ -243,38 +246,21 @@ class GeneticAlgorithmContinue(ExecModel):
                     n_iter = 1
             else:
                 n0[generation % len(n0)] = population[0, -1]
-
-            best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-            if population[0, -1] < best_fitness:
-                np.save(
-                    self.model_path + '/out/{:d}/generation.npy'.format(
-                        nth_paramset
-                    ), generation + int(count_num) + 1
-                )
-                np.save(
-                    self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                        nth_paramset, generation + int(count_num) + 1
-                    ), best_indiv
+            if self.migration is not None:
+                population = self.migration.migrate(
+                    nth_paramset, generation, population
                 )
-                np.save(
-                    self.model_path + '/out/{:d}/best_fitness'.format(
-                        nth_paramset
-                    ), best_fitness
+
+            self.recorder.log(
+                'Generation{:d}: Best Fitness = {:e}\n'.format(
+                    generation + int(count_num) + 1, population[0, -1]
                 )
-            best_fitness = population[0, -1]
-            np.save(
-                self.model_path + '/out/{:d}/count_num.npy'.format(
-                    nth_paramset
-                ), generation + int(count_num) + 1
             )
-            with open(
-                    self.model_path + '/out/{:d}/'
-                    'optimization.log'.format(nth_paramset), mode='a') as f:
-                f.write(
-                    'Generation{:d}: Best Fitness = {:e}\n'.format(
-                        generation + int(count_num) + 1, best_fitness
-                    )
-                )
+            self.recorder.record(
+                generation + int(count_num) + 1,
+                self.sp.gene2val(population[0, :self.n_gene]),
+                population[0, -1]
+            )
             if population[0, -1] <= self.allowable_error:
                 best_indiv = self.sp.gene2val(population[0, :self.n_gene])
                 best_fitness = population[0, -1]
@@ -286,4 +272,59 @@ class GeneticAlgorithmContinue(ExecModel):
         best_indiv = self.sp.gene2val(population[0, :self.n_gene])
         best_fitness = population[0, -1]
 
-        return best_indiv, best_fitness
\ No newline at end of file
+        return best_indiv, best_fitness
+
+    def _ga_v3_continue(self, nth_paramset):
+        didc = DistanceIndependentDiversityControl(
+            self.obj_func, self.n_population, self.n_children, self.n_gene,
+            self.evaluator
+        )
+        (best_indiv, _, _, count_num) = self.results.get(nth_paramset)
+        best_indiv_gene = self.sp.val2gene(best_indiv)
+        best_fitness = self.evaluator(best_indiv_gene[np.newaxis, :])[0]
+
+        population = self._set_continue(nth_paramset)
+        if best_fitness < population[0, -1]:
+            population.replace(0, np.append(best_indiv_gene, best_fitness))
+        self.recorder.log(
+            '\n----------------------------------------\n\n' +
+            'Generation{:d}: Best Fitness = {:e}\n'.format(
+                int(count_num) + 1, population[0, -1]
+            )
+        )
+        self.recorder.record(
+            int(count_num) + 1,
+            self.sp.gene2val(population[0, :self.n_gene]),
+            population[0, -1]
+        )
+        generation = 1
+
+        def _callback(population):
+            nonlocal generation
+            if self.migration is not None:
+                self.migration.migrate(
+                    nth_paramset, generation, population
+                )
+            self.recorder.log(
+                'Generation{:d}: Best Fitness = {:e}\n'.format(
+                    generation + int(count_num) + 1, population[0, -1]
+                )
+            )
+            self.recorder.record(
+                generation + int(count_num) + 1,
+                self.sp.gene2val(population[0, :self.n_gene]),
+                population[0, -1]
+            )
+            generation += 1
+
+            return population[0, -1] <= self.allowable_error or \
+                generation >= self.max_generation
+
+        if population[0, -1] > self.allowable_error and \
+                generation < self.max_generation:
+            population = didc.steady_state(population, _callback)
+
+        best_indiv = self.sp.gene2val(population[0, :self.n_gene])
+        best_fitness = population[0, -1]
+
+        return best_indiv, best_fitness
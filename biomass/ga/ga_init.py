@@ -3,11 +3,18 @@ import time
 import numpy as np
 
 from biomass.exec_model import ExecModel
+from .evaluator import Evaluator
+from .population import Population
+from .recorder import RunRecorder
 from .rcga import (UnimodalNormalDistributionXover,
                    DistanceIndependentDiversityControl)
 
 class GeneticAlgorithmInit(ExecModel):
-    def __init__(self, model, max_generation, allowable_error):
+    def __init__(self, model, max_generation, allowable_error,
+                 backend='serial', n_workers=None,
+                 flush_interval=100, flush_on_improvement=True,
+                 tolerance_schedule=None, budget=None, migration=None,
+                 asynchronous=False, cache=None):
         super().__init__(model)
         self.search_rgn = self.sp.get_region()
         self.n_population = int(5*self.search_rgn.shape[1])
@@ -15,6 +22,14 @@ class GeneticAlgorithmInit(ExecModel):
         self.n_gene = self.search_rgn.shape[1]
         self.max_generation = max_generation
         self.allowable_error = allowable_error
+        self.evaluator = Evaluator(
+            self.obj_func, backend, n_workers, tolerance_schedule, budget,
+            cache
+        )
+        self.flush_interval = flush_interval
+        self.flush_on_improvement = flush_on_improvement
+        self.migration = migration
+        self.asynchronous = asynchronous
     
         if self.n_population < self.n_gene + 2:
             raise ValueError(
@@ -33,7 +48,7 @@ class GeneticAlgorithmInit(ExecModel):
                 )
             )
             for file in files:
-                if any(map(file.__contains__, ('.npy', '.log'))):
+                if any(map(file.__contains__, ('.npy', '.log', '.csv'))):
                     os.remove(
                         self.model_path + '/out/{:d}/{}'.format(
                             nth_paramset, file
@@ -48,59 +63,84 @@ class GeneticAlgorithmInit(ExecModel):
         np.random.seed(
             time.time_ns()*nth_paramset % 2**32
         )
-        (best_indiv, best_fitness) = self._ga_v2(nth_paramset)
+        self.results.clear(nth_paramset)
+        self.recorder = RunRecorder(
+            self.results, nth_paramset,
+            self.flush_interval, self.flush_on_improvement
+        )
+        self.evaluator.n_screened = 0
+        self.evaluator.n_exact = 0
+        self.evaluator.n_aborted = 0
+        if self.evaluator.cache is not None:
+            self.evaluator.cache.clear()
+        if self.migration is not None:
+            self.migration.n_immigrants = 0
+        try:
+            if self.asynchronous:
+                (best_indiv, best_fitness) = self._ga_v3(nth_paramset)
+            else:
+                (best_indiv, best_fitness) = self._ga_v2(nth_paramset)
+            if self.evaluator.tolerance_schedule:
+                self.recorder.log(
+                    'Evaluated {:d} of {:d} children at full accuracy\n'
+                    .format(self.evaluator.n_exact, self.evaluator.n_screened)
+                )
+            if self.evaluator.budget:
+                self.recorder.log(
+                    'Aborted {:d} simulations that exceeded the budget\n'
+                    .format(self.evaluator.n_aborted)
+                )
+            if self.migration is not None:
+                self.recorder.log(
+                    'Accepted {:d} immigrants from other paramsets\n'
+                    .format(self.migration.n_immigrants)
+                )
+            if self.evaluator.cache is not None:
+                self.recorder.log(
+                    'Found {:d} of {:d} objective values in the cache '
+                    '({:.1%})\n'.format(
+                        self.evaluator.cache.hits,
+                        self.evaluator.cache.hits
+                        + self.evaluator.cache.misses,
+                        self.evaluator.cache.hit_rate
+                    )
+                )
+        finally:
+            self.recorder.close()
+            self.evaluator.close()
 
     def _set_initial(self, nth_paramset):
-        population = np.full((self.n_population, self.n_gene+1), np.inf)
-        with open(
-                self.model_path + '/out/{:d}/'
-                'optimization.log'.format(nth_paramset), mode='w') as f:
-            f.write(
-                'Generating the initial population. . .\n'
+        self.recorder.log('Generating the initial population. . .\n')
+        (population, n_rejected) = self.evaluator.sample(
+            lambda n: np.random.rand(n, self.n_gene), self.n_population,
+            lambda n_accepted, _: self.recorder.log(
+                '{:d} / {:d}\n'.format(n_accepted, self.n_population)
             )
-        for i in range(self.n_population):
-            while not np.isfinite(population[i, -1]):
-                population[i, :self.n_gene] = np.random.rand(self.n_gene)
-                population[i, -1] = self.obj_func(population[i, :self.n_gene])
-            with open(
-                    self.model_path + '/out/{:d}/'
-                    'optimization.log'.format(nth_paramset), mode='a') as f:
-                f.write(
-                    '{:d} / {:d}\n'.format(i + 1, self.n_population)
-                )
-        population = population[np.argsort(population[:, -1]), :]
+        )
+        self.recorder.log(
+            'Rejected {:d} infeasible samples\n'.format(n_rejected)
+        )
+        if self.evaluator.budget:
+            self.recorder.log(
+                'Aborted {:d} simulations that exceeded the budget\n'
+                .format(self.evaluator.n_aborted)
+            )
+        population = Population(population)
 
         return population
 
     def _ga_v1(self, nth_paramset):
         undx = UnimodalNormalDistributionXover(
-            self.obj_func, self.n_population, self.n_children, self.n_gene
+            self.obj_func, self.n_population, self.n_children, self.n_gene,
+            self.evaluator
         )
         population = self._set_initial(nth_paramset)
-        with open(
-                self.model_path + '/out/{:d}/'
-                'optimization.log'.format(nth_paramset), mode='a') as f:
-            f.write(
-                '\n----------------------------------------\n\n' +
-                'Generation1: Best Fitness = {:e}\n'.format(population[0, -1])
-            )
-        best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-        best_fitness = population[0, -1]
-
-        np.save(
-            self.model_path + '/out/{:d}/generation.npy'.format(
-                nth_paramset
-            ), 1
-        )
-        np.save(
-            self.model_path + '/out/{:d}/fit_param1'.format(
-                nth_paramset
-            ), best_indiv
+        self.recorder.log(
+            '\n----------------------------------------\n\n' +
+            'Generation1: Best Fitness = {:e}\n'.format(population[0, -1])
         )
-        np.save(
-            self.model_path + '/out/{:d}/best_fitness.npy'.format(
-                nth_paramset
-            ), best_fitness
+        self.recorder.record(
+            1, self.sp.gene2val(population[0, :self.n_gene]), population[0, -1]
         )
         if population[0, -1] <= self.allowable_error:
             best_indiv = self.sp.gene2val(population[0, :self.n_gene])
@@ -111,37 +151,16 @@ class GeneticAlgorithmInit(ExecModel):
         generation = 1
         while generation < self.max_generation:
             population = undx.mgg_alternation(population)
-            best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-            if population[0, -1] < best_fitness:
-                np.save(
-                    self.model_path + '/out/{:d}/generation.npy'.format(
-                        nth_paramset
-                    ), generation + 1
-                )
-                np.save(
-                    self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                        nth_paramset, generation + 1
-                    ), best_indiv
+            self.recorder.log(
+                'Generation{:d}: Best Fitness = {:e}\n'.format(
+                    generation + 1, population[0, -1]
                 )
-            best_fitness = population[0, -1]
-            np.save(
-                self.model_path + '/out/{:d}/best_fitness.npy'.format(
-                    nth_paramset
-                ), best_fitness
             )
-            np.save(
-                self.model_path + '/out/{:d}/count_num.npy'.format(
-                    nth_paramset
-                ), generation + 1
+            self.recorder.record(
+                generation + 1,
+                self.sp.gene2val(population[0, :self.n_gene]),
+                population[0, -1]
             )
-            with open(
-                    self.model_path + '/out/{:d}/'
-                    'optimization.log'.format(nth_paramset), mode='a') as f:
-                f.write(
-                    'Generation{:d}: Best Fitness = {:e}\n'.format(
-                        generation + 1, best_fitness
-                    )
-                )
             if population[0, -1] <= self.allowable_error:
                 best_indiv = self.sp.gene2val(population[0, :self.n_gene])
                 best_fitness = population[0, -1]
@@ -229,7 +248,8 @@ class GeneticAlgorithmInit(ExecModel):
             Otherwise, Generation <- Generation + 1, and return to the step 2.
         """
         didc = DistanceIndependentDiversityControl(
-            self.obj_func, self.n_population, self.n_children, self.n_gene
+            self.obj_func, self.n_population, self.n_children, self.n_gene,
+            self.evaluator
         )
         n_iter = 1
         n0 = np.empty(3*self.n_population)
@@ -237,30 +257,12 @@ class GeneticAlgorithmInit(ExecModel):
         population = self._set_initial(nth_paramset)
         n0[0] = population[0, -1]
 
-        with open(
-                self.model_path + '/out/{:d}/'
-                'optimization.log'.format(nth_paramset), mode='a') as f:
-            f.write(
-                '\n----------------------------------------\n\n' +
-                'Generation1: Best Fitness = {:e}\n'.format(population[0, -1])
-            )
-        best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-        best_fitness = population[0, -1]
-
-        np.save(
-            self.model_path + '/out/{:d}/generation.npy'.format(
-                nth_paramset
-            ), 1
-        )
-        np.save(
-            self.model_path + '/out/{:d}/fit_param1.npy'.format(
-                nth_paramset
-            ), best_indiv
+        self.recorder.log(
+            '\n----------------------------------------\n\n' +
+            'Generation1: Best Fitness = {:e}\n'.format(population[0, -1])
         )
-        np.save(
-            self.model_path + '/out/{:d}/best_fitness.npy'.format(
-                nth_paramset
-            ), best_fitness
+        self.recorder.record(
+            1, self.sp.gene2val(population[0, :self.n_gene]), population[0, -1]
         )
         if population[0, -1] <= self.allowable_error:
             best_indiv = self.sp.gene2val(population[0, :self.n_gene])
@@ -288,38 +290,21 @@ class GeneticAlgorithmInit(ExecModel):
                     n_iter = 1
             else:
                 n0[generation % len(n0)] = population[0, -1]
-
-            best_indiv = self.sp.gene2val(population[0, :self.n_gene])
-            if population[0, -1] < best_fitness:
-                np.save(
-                    self.model_path + '/out/{:d}/generation.npy'.format(
-                        nth_paramset
-                    ), generation + 1
+            if self.migration is not None:
+                population = self.migration.migrate(
+                    nth_paramset, generation, population
                 )
-                np.save(
-                    self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                        nth_paramset, generation + 1
-                    ), best_indiv
+
+            self.recorder.log(
+                'Generation{:d}: Best Fitness = {:e}\n'.format(
+                    generation + 1, population[0, -1]
                 )
-            best_fitness = population[0, -1]
-            np.save(
-                self.model_path + '/out/{:d}/best_fitness.npy'.format(
-                    nth_paramset
-                ), best_fitness
             )
-            np.save(
-                self.model_path + '/out/{:d}/count_num.npy'.format(
-                    nth_paramset
-                ), generation + 1
+            self.recorder.record(
+                generation + 1,
+                self.sp.gene2val(population[0, :self.n_gene]),
+                population[0, -1]
             )
-            with open(
-                    self.model_path + '/out/{:d}/'
-                    'optimization.log'.format(nth_paramset), mode='a') as f:
-                f.write(
-                    'Generation{:d}: Best Fitness = {:e}\n'.format(
-                        generation + 1, best_fitness
-                    )
-                )
             if population[0, -1] <= self.allowable_error:
                 best_indiv = self.sp.gene2val(population[0, :self.n_gene])
                 best_fitness = population[0, -1]
@@ -332,3 +317,59 @@ class GeneticAlgorithmInit(ExecModel):
         best_fitness = population[0, -1]
 
         return best_indiv, best_fitness
+
+    def _ga_v3(self, nth_paramset):
+        """ga_v3 is an asynchronous steady-state version of ga_v2 for
+        objective functions whose cost varies between individuals.
+
+        The workers of the evaluator are kept busy: each child replaces the
+        worst individual as soon as its objective value arrives, and a new
+        child is generated from the current population for the free worker
+        (see DistanceIndependentDiversityControl.steady_state). A generation
+        is counted every n_children objective values. Children are always
+        evaluated at full accuracy.
+        """
+        didc = DistanceIndependentDiversityControl(
+            self.obj_func, self.n_population, self.n_children, self.n_gene,
+            self.evaluator
+        )
+        population = self._set_initial(nth_paramset)
+
+        self.recorder.log(
+            '\n----------------------------------------\n\n' +
+            'Generation1: Best Fitness = {:e}\n'.format(population[0, -1])
+        )
+        self.recorder.record(
+            1, self.sp.gene2val(population[0, :self.n_gene]), population[0, -1]
+        )
+        generation = 1
+
+        def _callback(population):
+            nonlocal generation
+            if self.migration is not None:
+                self.migration.migrate(
+                    nth_paramset, generation, population
+                )
+            self.recorder.log(
+                'Generation{:d}: Best Fitness = {:e}\n'.format(
+                    generation + 1, population[0, -1]
+                )
+            )
+            self.recorder.record(
+                generation + 1,
+                self.sp.gene2val(population[0, :self.n_gene]),
+                population[0, -1]
+            )
+            generation += 1
+
+            return population[0, -1] <= self.allowable_error or \
+                generation >= self.max_generation
+
+        if population[0, -1] > self.allowable_error and \
+                generation < self.max_generation:
+            population = didc.steady_state(population, _callback)
+
+        best_indiv = self.sp.gene2val(population[0, :self.n_gene])
+        best_fitness = population[0, -1]
+
+        return best_indiv, best_fitness
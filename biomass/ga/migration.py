@@ -0,0 +1,161 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+
+class Migration(object):
+    """ Exchange of elite individuals between paramsets optimized in
+    parallel (island model).
+
+    Every interval generations, each island, i.e., the population of a
+    paramset, publishes its n_migrants best individuals in
+    out_dir/migration.db and receives those of the islands it is connected
+    to. An immigrant replaces the worst individual of the population if it
+    is better and not already in the population.
+
+    Parameters
+    ----------
+    out_dir : str
+        model_path + '/out'.
+
+    islands : list of int
+        Paramsets that take part in the migration.
+
+    topology : str
+        - 'ring': Each island receives from the previous one in islands.
+        - 'random': Each island receives from another island drawn at random
+            at every migration.
+        - 'fully_connected': Each island receives from all the others.
+
+    interval : int
+        Number of generations between migrations.
+
+    n_migrants : int
+        Number of individuals published by each island.
+
+    Attributes
+    ----------
+    n_immigrants : int
+        Number of immigrants accepted into the population.
+
+    Notes
+    -----
+    A connection is opened for each migration, so the channel can be shared
+    by paramsets optimized in parallel and pickled along with the GA, like
+    biomass.result_store.ResultStore. Migration does not wait for the other
+    islands: if there are more islands than processes, those that have
+    finished leave their last elites in the channel, and those that have not
+    started yet are skipped.
+    """
+    topologies = ['ring', 'random', 'fully_connected']
+
+    def __init__(self, out_dir, islands, topology='ring', interval=10,
+                 n_migrants=1):
+        if topology not in self.topologies:
+            raise ValueError(
+                "Available topologies are: '"
+                + "', '".join(self.topologies) + "'"
+            )
+        if interval < 1:
+            raise ValueError('interval must be a positive integer')
+        if n_migrants < 1:
+            raise ValueError('n_migrants must be a positive integer')
+        self.out_dir = out_dir
+        self.path = out_dir + '/migration.db'
+        self.islands = list(islands)
+        self.topology = topology
+        self.interval = interval
+        self.n_migrants = n_migrants
+        self.n_immigrants = 0
+
+    def _connect(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=60)
+        con.execute(
+            'CREATE TABLE IF NOT EXISTS migrants ('
+            'paramset INTEGER PRIMARY KEY, generation INTEGER, '
+            'n_col INTEGER, individuals BLOB)'
+        )
+        return con
+
+    def clear(self):
+        """ Remove the migrants of earlier runs. Call it before the islands
+        are started.
+        """
+        with closing(self._connect()) as con, con:
+            con.execute('DELETE FROM migrants')
+
+    def _sources(self, nth_paramset):
+        others = [
+            island for island in self.islands if island != nth_paramset
+        ]
+        if not others:
+            return []
+        if self.topology == 'ring':
+            k = self.islands.index(nth_paramset)
+            return [self.islands[k-1]]
+        elif self.topology == 'random':
+            return [others[np.random.randint(len(others))]]
+        else:
+            return others
+
+    def migrate(self, nth_paramset, generation, population):
+        """ Publish the elites of the population and accept immigrants, if
+        generation is a multiple of interval.
+
+        Parameters
+        ----------
+        nth_paramset : int
+
+        generation : int
+
+        population : biomass.ga.Population
+            Updated in place.
+
+        Returns
+        -------
+        population : biomass.ga.Population
+
+        """
+        if generation % self.interval != 0:
+            return population
+        sources = self._sources(nth_paramset)
+        elites = np.ascontiguousarray(
+            population[:self.n_migrants, :], dtype=float
+        )
+        with closing(self._connect()) as con, con:
+            con.execute(
+                'INSERT OR REPLACE INTO migrants VALUES (?, ?, ?, ?)',
+                (
+                    nth_paramset, int(generation), elites.shape[1],
+                    elites.tobytes()
+                )
+            )
+            rows = con.execute(
+                'SELECT n_col, individuals FROM migrants WHERE paramset IN '
+                '(' + ', '.join('?' * len(sources)) + ')', sources
+            ).fetchall() if sources else []
+        immigrants = [
+            np.frombuffer(individuals).reshape(-1, n_col)
+            for (n_col, individuals) in rows
+            if n_col == population.shape[1]
+        ]
+        if not immigrants:
+            return population
+        immigrants = np.concatenate(immigrants)
+        immigrants = immigrants[np.argsort(immigrants[:, -1]), :]
+        n_accepted = 0
+        worst = len(population) - 1
+        for immigrant in immigrants:
+            if not immigrant[-1] < population[worst, -1]:
+                break
+            if np.any(
+                    np.all(population[:, :-1] == immigrant[:-1], axis=1)):
+                continue
+            population.replace(worst, immigrant)
+            n_accepted += 1
+        self.n_immigrants += n_accepted
+
+        return population
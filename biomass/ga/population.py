@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class Population(object):
+    """ Individuals in the order of their objective values.
+
+    The individuals stay in place in an array of shape
+    (n_population, n_gene+1), whose last column holds the objective values,
+    and their rank order is kept in an index. When individuals are
+    replaced, only their entries are moved within the index, by binary
+    search, so the population is neither copied nor sorted again.
+
+    Parameters
+    ----------
+    individuals : array_like
+        (n_population, n_gene+1), in any order.
+
+    Notes
+    -----
+    Indexing is by rank, like that of the sorted arrays used before:
+    population[0, -1] is the best objective value and population[ip, :] the
+    individuals of ranks ip (a copy). Individuals are changed only by
+    replace.
+    """
+    def __init__(self, individuals):
+        self.individuals = np.array(individuals, dtype=float)
+        self.order = np.argsort(self.individuals[:, -1], kind='stable')
+        self._fitness = self.individuals[self.order, -1]
+
+    @property
+    def shape(self):
+        return self.individuals.shape
+
+    def __len__(self):
+        return len(self.individuals)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.individuals[(self.order[key[0]],) + key[1:]]
+        else:
+            return self.individuals[self.order[key]]
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.individuals[self.order], dtype=dtype)
+
+    def replace(self, ranks, individuals):
+        """ Replace the individuals of the given ranks.
+
+        Parameters
+        ----------
+        ranks : int or list of int
+            Distinct ranks before the replacement.
+
+        individuals : array_like
+            (n_gene+1,) or (len(ranks), n_gene+1).
+
+        """
+        ranks = [int(rank) for rank in np.atleast_1d(ranks)]
+        individuals = np.atleast_2d(individuals)
+        self.individuals[self.order[ranks], :] = individuals
+        for (i, rank) in enumerate(ranks):
+            new_rank = self._move(rank, individuals[i, -1])
+            # The ranks in between are shifted by one.
+            for j in range(i+1, len(ranks)):
+                if rank < ranks[j] <= new_rank:
+                    ranks[j] -= 1
+                elif new_rank <= ranks[j] < rank:
+                    ranks[j] += 1
+
+    def _move(self, rank, fitness):
+        order = self.order
+        sorted_fitness = self._fitness
+        row = order[rank]
+        if fitness < sorted_fitness[rank]:
+            new_rank = np.searchsorted(
+                sorted_fitness[:rank], fitness, side='right'
+            )
+            order[new_rank+1:rank+1] = order[new_rank:rank]
+            sorted_fitness[new_rank+1:rank+1] = sorted_fitness[new_rank:rank]
+        else:
+            new_rank = rank + np.searchsorted(
+                sorted_fitness[rank+1:], fitness, side='right'
+            )
+            order[rank:new_rank] = order[rank+1:new_rank+1]
+            sorted_fitness[rank:new_rank] = sorted_fitness[rank+1:new_rank+1]
+        order[new_rank] = row
+        sorted_fitness[new_rank] = fitness
+
+        return new_rank
@@ -1,5 +1,29 @@
 import numpy as np
 
+from .evaluator import Evaluator
+
+
+def _sample_without_replacement(n_samples, n_population, size, excluded=None):
+    """ n_samples independent draws of size distinct indices out of
+    n_population, like np.random.choice(n_population, size, replace=False)
+    in a loop, but in a single call. The order of the indices within a draw
+    is not random.
+    """
+    keys = np.random.rand(n_samples, n_population)
+    if excluded is not None:
+        keys[:, excluded] = np.inf
+
+    return np.argpartition(keys, size-1, axis=1)[:, :size]
+
+
+def _weighted_deviation(weights, genes):
+    """ sum_k weights[k] * (genes[k] - mean(genes)), over the last but one
+    axis of genes, without the array of deviations.
+    """
+    return np.einsum('...k,...kj->...j', weights, genes) \
+        - np.sum(weights, axis=-1)[..., np.newaxis] \
+        * np.mean(genes, axis=-2)
+
 
 class UnimodalNormalDistributionXover(object):
     """ - UNDX: 
@@ -13,8 +37,11 @@ class UnimodalNormalDistributionXover(object):
             of genetic algorithms and its assesment. J. Jpn Soc. Artif. Intell. 
             12, 734–744 (1997).
     """
-    def __init__(self, obj_func, n_population, n_children, n_gene):
+    def __init__(self, obj_func, n_population, n_children, n_gene,
+                 evaluator=None):
         self.obj_func = obj_func
+        self.evaluator = Evaluator(obj_func) if evaluator is None \
+            else evaluator
         self.n_population = n_population
         self.n_children = n_children
         self.n_gene = n_gene
@@ -70,7 +97,7 @@ class UnimodalNormalDistributionXover(object):
         """
         child = self._undx(parents)
         child[:self.n_gene] = np.clip(child[:self.n_gene], 0., 1.)
-        child[-1] = self.obj_func(child[:self.n_gene])
+        child[-1] = np.inf  # evaluated together with the other children.
 
         return child
 
@@ -96,18 +123,26 @@ class UnimodalNormalDistributionXover(object):
         for i in range(self.n_children):
             ip[2] = np.random.choice(np.arange(self.n_population)[idx])
             children[i, :] = self._get_new_child(population[ip, :])
+        # Only the children that may become the elite are evaluated at full
+        # accuracy.
+        (children[:, -1], exact) = self.evaluator.screen(
+            children[:, :self.n_gene],
+            min(population[ip[0], -1], population[ip[1], -1])
+        )
+
         family = np.empty((self.n_children+2, self.n_gene+1))
         family[:self.n_children, :] = children
         family[-2, :] = population[ip[0], :]
         family[-1, :] = population[ip[1], :]
-        family = family[np.argsort(family[:, -1]), :]
-        # Elite
-        population[ip[0], :] = family[0, :]
+        order = np.argsort(family[:, -1])
+        family = family[order, :]
+        exact = np.append(exact, [True, True])[order]
         # Rank-based Roulette Selection
         ic1 = self._rank_selection(self.n_children+2)
-        population[ip[1], :] = family[ic1, :]
-
-        population = population[np.argsort(population[:, -1]), :]
+        if not exact[ic1]:
+            family[ic1, -1] = self.evaluator(family[[ic1], :self.n_gene])[0]
+        # Elite and the selected individual
+        population.replace(ip[:2], family[[0, ic1], :])
 
         return population
 
@@ -118,8 +153,11 @@ class DistanceIndependentDiversityControl(object):
             Independent Diversity Control for High Dimensional Function 
             Optimization. J. Japanese Soc. Artif. Intell. 18, 193–202 (2003).
     """
-    def __init__(self, obj_func, n_population, n_children, n_gene):
+    def __init__(self, obj_func, n_population, n_children, n_gene,
+                 evaluator=None):
         self.obj_func = obj_func
+        self.evaluator = Evaluator(obj_func) if evaluator is None \
+            else evaluator
         self.n_population = n_population
         self.n_children = n_children
         self.n_gene = n_gene
@@ -128,25 +166,25 @@ class DistanceIndependentDiversityControl(object):
 
     def _endx(self, parents):
         """Extended Normal Distribution Xover
+
+        parents is (n_gene+2, n_gene+1) for a child, or
+        (n_children, n_gene+2, n_gene+1) to generate all children at once.
         """
         ALPHA = (1.-2*0.35**2)**0.5/2.
         BETA = 0.35/(self.n_gene-1)**0.5
 
-        child = np.empty(self.n_gene+1)
+        batch_shape = parents.shape[:-2]
+        genes = parents[..., :self.n_gene]
+        child = np.empty(batch_shape + (self.n_gene+1,))
 
-        t1 = (parents[1, :self.n_gene]-parents[0, :self.n_gene]) / 2.
-        t2 = np.random.normal(scale=ALPHA) * (
-            parents[1, :self.n_gene] - parents[0, :self.n_gene]
+        d = genes[..., 1, :] - genes[..., 0, :]
+        t1 = d / 2.
+        t2 = np.random.normal(scale=ALPHA, size=batch_shape + (1,)) * d
+        t3 = _weighted_deviation(
+            np.random.normal(scale=BETA, size=batch_shape + (self.n_gene,)),
+            genes[..., 2:, :]
         )
-        t3 = np.sum(
-            np.random.normal(scale=BETA, size=self.n_gene)[:, np.newaxis]
-            * (
-                parents[2:, :self.n_gene] - (
-                    np.sum(parents[2:, :self.n_gene], axis=0) / self.n_gene
-                )
-            ), axis=0
-        )
-        child[:self.n_gene] = t1 + t2 + t3
+        child[..., :self.n_gene] = t1 + t2 + t3
 
         return child
 
@@ -162,19 +200,18 @@ class DistanceIndependentDiversityControl(object):
             child[:self.n_gene] = np.clip(child[:self.n_gene], 0., 1.)
         """
         child = self._endx(parents)
-        child[:self.n_gene] = np.clip(child[:self.n_gene], 0., 1.)
-        child[-1] = np.inf  # assigns the worst objective value to the children.
+        child[..., :self.n_gene] = np.clip(child[..., :self.n_gene], 0., 1.)
+        child[..., -1] = np.inf  # assigns the worst objective value to the children.
 
         return child
 
     def converging(self, ip, population):
-        children = np.empty((self.n_children_for_endx, self.n_gene+1))
-
-        for i in range(self.n_children_for_endx):
-            ip[2:] = np.random.choice(
-                self.n_population, self.n_gene, replace=False
-            )
-            children[i, :] = self._xover(population[ip, :])
+        idx = np.empty((self.n_children_for_endx, self.n_gene+2), dtype=int)
+        idx[:, :2] = ip[:2]
+        idx[:, 2:] = _sample_without_replacement(
+            self.n_children_for_endx, self.n_population, self.n_gene
+        )
+        children = self._xover(population[idx, :])
 
         family = np.empty((self.n_children_for_endx+2, self.n_gene+1))
         family[:self.n_children_for_endx, :] = children
@@ -182,38 +219,34 @@ class DistanceIndependentDiversityControl(object):
         family[-1, :] = population[ip[1], :]
 
         family = family[np.argsort(family[:, -1]), :]
-        # Best, either of parents
-        population[ip[0], :] = family[0, :]
-        # Random
-        population[ip[1], :] = \
-            family[
-                np.random.randint(
-                    low=1, high=self.n_children_for_endx+2, dtype=np.int
-                ), :]
-
-        if not np.isfinite(population[ip[1], -1]):
-            population[ip[1], -1] = \
-                self.obj_func(population[ip[1], :self.n_gene])
-        population = population[np.argsort(population[:, -1]), :]
+        # Best, either of parents, and a random one
+        survivors = family[
+            [0, np.random.randint(low=1, high=self.n_children_for_endx+2)], :
+        ]
+        if not np.isfinite(survivors[1, -1]):
+            survivors[1, -1] = \
+                self.evaluator(survivors[[1], :self.n_gene])[0]
+        population.replace(ip[:2], survivors)
 
         return population
 
     def _ndm(self, parents):
         """Normal Distribution Mutation
+
+        parents is (n_gene+2, n_gene+1) for a child, or
+        (n_children, n_gene+2, n_gene+1) to generate all children at once.
         """
         GAMMA = 0.35/self.n_gene**0.5
 
-        child = np.empty(self.n_gene+1)
+        batch_shape = parents.shape[:-2]
+        genes = parents[..., :self.n_gene]
+        child = np.empty(batch_shape + (self.n_gene+1,))
 
-        t2 = np.sum(
-            np.random.normal(scale=GAMMA, size=self.n_gene+1)[:, np.newaxis]
-            * (
-                parents[1:, :self.n_gene] - (
-                    np.sum(parents[1:, :self.n_gene], axis=0) / (self.n_gene+1)
-                )
-            ), axis=0
+        t2 = _weighted_deviation(
+            np.random.normal(scale=GAMMA, size=batch_shape + (self.n_gene+1,)),
+            genes[..., 1:, :]
         )
-        child[:self.n_gene] = parents[0, :self.n_gene] + t2
+        child[..., :self.n_gene] = genes[..., 0, :] + t2
 
         return child
 
@@ -229,27 +262,85 @@ class DistanceIndependentDiversityControl(object):
             child[:self.n_gene] = np.clip(child[:self.n_gene], 0., 1.)
         """
         child = self._ndm(parents)
-        child[:self.n_gene] = np.clip(child[:self.n_gene], 0., 1.)
-        child[-1] = self.obj_func(child[:self.n_gene])
+        child[..., :self.n_gene] = np.clip(child[..., :self.n_gene], 0., 1.)
+        child[..., -1] = np.inf  # evaluated together with the other children.
 
         return child
 
     def local_search(self, ip, population):
-        idx = [True] * self.n_population
-        idx[ip[0]] = False
-
-        children = np.empty((self.n_children, self.n_gene+1))
+        idx = np.empty((self.n_children, self.n_gene+2), dtype=int)
+        idx[:, 0] = ip[0]
+        idx[:, 1:] = _sample_without_replacement(
+            self.n_children, self.n_population, self.n_gene+1, excluded=ip[0]
+        )
+        children = self._mutation(population[idx, :])
+        # Only the children that may replace the elite are evaluated at full
+        # accuracy.
+        (children[:, -1], _) = self.evaluator.screen(
+            children[:, :self.n_gene], population[ip[0], -1]
+        )
 
-        for i in range(self.n_children):
-            ip[1:] = np.random.choice(
-                np.arange(self.n_population)[idx], self.n_gene+1, replace=False
-            )
-            children[i, :] = self._mutation(population[ip, :])
         family = np.empty((self.n_children+1, self.n_gene+1))
         family[:self.n_children, :] = children
         family[-1, :] = population[ip[0], :]
         family = family[np.argsort(family[:, -1]), :]
-        population[ip[0], :] = family[0, :]  # Elite
-        population = population[np.argsort(population[:, -1]), :]
+        population.replace(ip[0], family[0, :])  # Elite
+
+        return population
+
+    def steady_state(self, population, callback):
+        """ Asynchronous steady-state alternation.
+
+        Children are not evaluated in batches as in local_search: whenever
+        the objective value of a child arrives, the child replaces the worst
+        individual if it is better, and the next child is generated from the
+        current population (see Evaluator.evaluate_async). The children are
+        generated alternately by NDM around the best individual, as in
+        local_search, and by ENDX from randomly selected parents, as in
+        converging.
+
+        Parameters
+        ----------
+        population : biomass.ga.Population
+            Updated in place.
+
+        callback : callable
+            callback(population) is called after every n_children objective
+            values and returns True to stop.
+
+        """
+        n_proposed = 0
+        n_accepted = 0
+
+        def _propose():
+            nonlocal n_proposed
+            n_proposed += 1
+            if n_proposed % 2 == 1:
+                ip = np.empty(self.n_gene+2, dtype=int)
+                ip[0] = 0
+                ip[1:] = np.random.choice(
+                    np.arange(1, self.n_population), self.n_gene+1,
+                    replace=False
+                )
+                child = self._mutation(population[ip, :])
+            else:
+                ip = np.random.choice(
+                    self.n_population, self.n_gene+2, replace=False
+                )
+                child = self._xover(population[ip, :])
+
+            return child[:self.n_gene]
+
+        def _accept(indiv_gene, fitness):
+            nonlocal n_accepted
+            n_accepted += 1
+            if fitness < population[-1, -1]:
+                population.replace(
+                    self.n_population-1, np.append(indiv_gene, fitness)
+                )
+
+            return n_accepted % self.n_children == 0 and callback(population)
+
+        self.evaluator.evaluate_async(_propose, _accept)
 
         return population
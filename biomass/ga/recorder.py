@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class RunRecorder(object):
+    """ Buffer the progress of a GA run and write it out in batches.
+
+    Files
+    -----
+    out/{n}/optimization.log : Progress messages (appended).
+    out/{n}/trace.csv : 'generation,best_fitness' for every generation
+        (appended).
+    out/results.db : Best individual, its improvements, best fitness and
+        the number of generations run (see biomass.result_store).
+
+    Parameters
+    ----------
+    store : biomass.result_store.ResultStore
+
+    nth_paramset : int
+
+    flush_interval : int
+        Maximum number of generations kept in memory. The first generation,
+        i.e., the initial population, is written out at once.
+
+    flush_on_improvement : bool
+        If True, the buffer is also flushed when the best individual is
+        improved, unless improvements have been written within the last
+        flush_interval generations. Frequent improvements early in a run
+        are thus still buffered, and a rare one later is not held back.
+
+    Notes
+    -----
+    The results of a flush are written to the store in a single transaction.
+    If the process is killed, the store therefore stays consistent and at
+    most flush_interval generations are lost, which is what
+    GeneticAlgorithmContinue needs to resume the run.
+    """
+    def __init__(self, store, nth_paramset, flush_interval=100,
+                 flush_on_improvement=True):
+        if flush_interval < 1:
+            raise ValueError('flush_interval must be a positive integer')
+        self.store = store
+        self.nth_paramset = nth_paramset
+        self.out_dir = store.out_dir + '/{:d}'.format(nth_paramset)
+        self.flush_interval = flush_interval
+        self.flush_on_improvement = flush_on_improvement
+        self.best_fitness = np.inf
+        self._messages = []
+        self._trace = []
+        self._improvements = []  # (generation, best_indiv, best_fitness)
+        self._generation = None
+        self._last_flush = None
+        self._last_improvement_flush = None
+
+    def log(self, message):
+        self._messages.append(message)
+
+    def record(self, generation, best_indiv, best_fitness):
+        """ Record the best individual of a generation.
+
+        Parameters
+        ----------
+        generation : int
+
+        best_indiv : numpy array
+            Parameter values (not genes) of the best individual.
+
+        best_fitness : float
+
+        Returns
+        -------
+        improved : bool
+
+        """
+        improved = best_fitness < self.best_fitness
+        if improved:
+            self._improvements.append(
+                (generation, np.array(best_indiv, copy=True), best_fitness)
+            )
+        self.best_fitness = min(best_fitness, self.best_fitness)
+        self._generation = generation
+        self._trace.append((generation, best_fitness))
+        if self._last_flush is None:
+            self.flush()
+        elif generation - self._last_flush >= self.flush_interval:
+            self.flush()
+        elif improved and self.flush_on_improvement and (
+                self._last_improvement_flush is None
+                or generation - self._last_improvement_flush
+                >= self.flush_interval):
+            self.flush()
+
+        return improved
+
+    def flush(self):
+        if self._messages:
+            with open(self.out_dir + '/optimization.log', mode='a') as f:
+                f.write(''.join(self._messages))
+            self._messages = []
+        if self._trace:
+            with open(self.out_dir + '/trace.csv', mode='a') as f:
+                f.write(
+                    ''.join(
+                        '{:d},{:e}\n'.format(generation, fitness)
+                        for (generation, fitness) in self._trace
+                    )
+                )
+            self._trace = []
+        if self._generation is not None:
+            self.store.write(
+                self.nth_paramset, self._generation, self.best_fitness,
+                self._improvements
+            )
+            if self._improvements:
+                self._last_improvement_flush = self._generation
+            self._improvements = []
+            self._last_flush = self._generation
+
+    def close(self):
+        self.flush()
@@ -1,6 +1,9 @@
+import threading
+
 import numpy as np
 from scipy.spatial.distance import cosine
 
+from biomass.solver import BudgetExceeded
 from .observable import observables, ExperimentalData, NumericalSimulation
 from .set_search_param import SearchParam
 
@@ -35,118 +38,181 @@ def _diff_sim_and_exp(
     return np.array(sim_val) / sim_norm_max, np.array(exp_val)
 
 
-def objective(indiv_gene, *args):
-    """Define an objective function to be minimized
-    """
-    if len(args) == 0:
-        sp = SearchParam()
-        indiv = sp.gene2val(indiv_gene)
-        (x, y0) = sp.update(indiv)
-    elif len(args) == 1:
-        raise ValueError('not enough values to unpack (expected 2, got 1)')
-    elif len(args) == 2:
-        (x, y0) = args
-    else:
-        raise ValueError('too many values to unpack (expected 2)')
-
-    exp = ExperimentalData()
-    sim = NumericalSimulation()
-
-    if sim.simulate(x, y0) is None:
-        error = np.zeros(len(observables))
-        for i, _ in enumerate(observables):
-            if exp.experiments[i] is not None:
-                error[i] = _compute_objval_rss(
-                    *_diff_sim_and_exp(
-                        sim.simulations[i], exp.experiments[i], 
-                        exp.get_timepoint(i), sim.conditions, 
-                        sim_norm_max=1 if not sim.normalization \
-                            else np.max(sim.simulations[i])
-                    )
-                )
-        '''
-        error = np.zeros(16)
-
-        norm_max = np.max(sim.simulations[observables.index('Phosphorylated_MEKc')])
-        error[0] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_MEKc'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_MEKc')]['EGF']
-        )
-        error[1] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_MEKc'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_MEKc')]['HRG']
-        )
+class Objective(object):
+    """Objective function to be minimized.
 
-        norm_max = np.max(sim.simulations[observables.index('Phosphorylated_ERKc')])
-        error[2] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_ERKc'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_ERKc')]['EGF']
-        )
-        error[3] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_ERKc'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_ERKc')]['HRG']
-        )
-
-        norm_max = np.max(sim.simulations[observables.index('Phosphorylated_RSKw')])
-        error[4] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_RSKw'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_RSKw')]['EGF']
-        )
-        error[5] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_RSKw'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_RSKw')]['HRG']
-        )
-
-        norm_max = np.max(sim.simulations[observables.index('Phosphorylated_CREBw')])
-        error[6] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_CREBw'), exp.t3, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_CREBw')]['EGF']
-        )
-        error[7] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_CREBw'), exp.t3, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_CREBw')]['HRG']
-        )
-
-        norm_max = np.max(sim.simulations[observables.index('dusp_mRNA')])
-        error[8] = _compute_objval_rss(
-            sim.simulations[observables.index('dusp_mRNA'), exp.t5, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('dusp_mRNA')]['EGF']
-        )
-        error[9] = _compute_objval_rss(
-            sim.simulations[observables.index('dusp_mRNA'), exp.t5, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('dusp_mRNA')]['HRG']
-        )
+    SearchParam, ExperimentalData and NumericalSimulation, the search region
+    and the experimental data arranged for comparison with the simulation are
+    prepared once and reused by every call.
+    """
+    def __init__(self):
+        self.sp = SearchParam()
+        self.search_rgn = self.sp.get_region()
+        self.exp = ExperimentalData()
+        self.sim = NumericalSimulation()
+
+        self.obs_idx = [
+            i for i, _ in enumerate(observables)
+            if self.exp.experiments[i] is not None
+        ]
+        # Fitting mode: record the simulation only at experimental time points.
+        self.timepoints = sorted(
+            set().union(*[self.exp.get_timepoint(i) for i in self.obs_idx])
+        )
+        self.sim_idx = {}
+        self.exp_val = {}
+        for i in self.obs_idx:
+            exp_t = np.searchsorted(self.timepoints, self.exp.get_timepoint(i))
+            exp_c = [
+                j for j, condition in enumerate(self.sim.conditions)
+                if condition in self.exp.experiments[i].keys()
+            ]
+            self.sim_idx[i] = (
+                np.tile(exp_t, len(exp_c)), np.repeat(exp_c, len(exp_t))
+            )
+            self.exp_val[i] = np.array(
+                [val for j in exp_c
+                 for val in self.exp.experiments[i][self.sim.conditions[j]]]
+            )
+
+    def __call__(self, indiv_gene, *args, solver_options=None):
+        if len(args) == 0:
+            # SearchParam.gene2val without recomputing the search region
+            indiv = 10**(
+                indiv_gene * (
+                    self.search_rgn[1, :] - self.search_rgn[0, :]
+                ) + self.search_rgn[0, :]
+            )
+            (x, y0) = self.sp.update(indiv)
+        elif len(args) == 1:
+            raise ValueError('not enough values to unpack (expected 2, got 1)')
+        elif len(args) == 2:
+            (x, y0) = args
+        else:
+            raise ValueError('too many values to unpack (expected 2)')
+
+        sim = self.sim
+        default_options = sim.solver_options
+        if solver_options is not None:
+            sim.solver_options = dict(default_options, **solver_options)
+        try:
+            status = sim.simulate(x, y0, timepoints=self.timepoints)
+        except BudgetExceeded:
+            return np.nan  # Aborted rather than failed
+        finally:
+            sim.solver_options = default_options
+        if status is None:
+            error = np.zeros(len(observables))
+            for i in self.obs_idx:
+                sim_val = sim.simulations_fit[i][self.sim_idx[i]]
+                if sim.normalization:
+                    sim_val = sim_val / sim.simulations_max[i]
+                error[i] = _compute_objval_rss(sim_val, self.exp_val[i])
+            '''
+            error = np.zeros(16)
+
+            norm_max = np.max(sim.simulations[observables.index('Phosphorylated_MEKc')])
+            error[0] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_MEKc'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_MEKc')]['EGF']
+            )
+            error[1] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_MEKc'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_MEKc')]['HRG']
+            )
+
+            norm_max = np.max(sim.simulations[observables.index('Phosphorylated_ERKc')])
+            error[2] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_ERKc'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_ERKc')]['EGF']
+            )
+            error[3] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_ERKc'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_ERKc')]['HRG']
+            )
+
+            norm_max = np.max(sim.simulations[observables.index('Phosphorylated_RSKw')])
+            error[4] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_RSKw'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_RSKw')]['EGF']
+            )
+            error[5] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_RSKw'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_RSKw')]['HRG']
+            )
+
+            norm_max = np.max(sim.simulations[observables.index('Phosphorylated_CREBw')])
+            error[6] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_CREBw'), exp.t3, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_CREBw')]['EGF']
+            )
+            error[7] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_CREBw'), exp.t3, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_CREBw')]['HRG']
+            )
+
+            norm_max = np.max(sim.simulations[observables.index('dusp_mRNA')])
+            error[8] = _compute_objval_rss(
+                sim.simulations[observables.index('dusp_mRNA'), exp.t5, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('dusp_mRNA')]['EGF']
+            )
+            error[9] = _compute_objval_rss(
+                sim.simulations[observables.index('dusp_mRNA'), exp.t5, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('dusp_mRNA')]['HRG']
+            )
+
+            norm_max = np.max(sim.simulations[observables.index('cfos_mRNA')])
+            error[10] = _compute_objval_rss(
+                sim.simulations[observables.index('cfos_mRNA'), exp.t4, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('cfos_mRNA')]['EGF']
+            )
+            error[11] = _compute_objval_rss(
+                sim.simulations[observables.index('cfos_mRNA'), exp.t4, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('cfos_mRNA')]['HRG']
+            )
+
+            norm_max = np.max(sim.simulations[observables.index('cFos_Protein')])
+            error[12] = _compute_objval_rss(
+                sim.simulations[observables.index('cFos_Protein'), exp.t5, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('cFos_Protein')]['EGF']
+            )
+            error[13] = _compute_objval_rss(
+                sim.simulations[observables.index('cFos_Protein'), exp.t5, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('cFos_Protein')]['HRG']
+            )
+
+            norm_max = np.max(sim.simulations[observables.index('Phosphorylated_cFos')])
+            error[14] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_cFos'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_cFos')]['EGF']
+            )
+            error[15] = _compute_objval_rss(
+                sim.simulations[observables.index('Phosphorylated_cFos'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
+                exp.experiments[observables.index('Phosphorylated_cFos')]['HRG']
+            )
+            '''
+            return np.sum(error)
+        else:
+            return np.inf
+
+
+_local = threading.local()
+
+
+def objective(indiv_gene, *args, solver_options=None):
+    """Define an objective function to be minimized
 
-        norm_max = np.max(sim.simulations[observables.index('cfos_mRNA')])
-        error[10] = _compute_objval_rss(
-            sim.simulations[observables.index('cfos_mRNA'), exp.t4, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('cfos_mRNA')]['EGF']
-        )
-        error[11] = _compute_objval_rss(
-            sim.simulations[observables.index('cfos_mRNA'), exp.t4, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('cfos_mRNA')]['HRG']
-        )
+    The Objective instance is created on the first call and reused for the
+    rest of the process. Each thread gets its own instance, since the
+    simulation buffers are not shared safely.
 
-        norm_max = np.max(sim.simulations[observables.index('cFos_Protein')])
-        error[12] = _compute_objval_rss(
-            sim.simulations[observables.index('cFos_Protein'), exp.t5, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('cFos_Protein')]['EGF']
-        )
-        error[13] = _compute_objval_rss(
-            sim.simulations[observables.index('cFos_Protein'), exp.t5, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('cFos_Protein')]['HRG']
-        )
+    solver_options (e.g., {'rtol': 1e-6, 'atol': 1e-6}) override the
+    options of the solver for this evaluation only. If they include limits
+    (max_evals, max_time, min_value, check_finite; see
+    biomass.solver.solve_ode) and the simulation exceeds them, NaN is
+    returned instead of inf.
+    """
+    if not hasattr(_local, 'objective'):
+        _local.objective = Objective()
 
-        norm_max = np.max(sim.simulations[observables.index('Phosphorylated_cFos')])
-        error[14] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_cFos'), exp.t2, sim.conditions.index('EGF')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_cFos')]['EGF']
-        )
-        error[15] = _compute_objval_rss(
-            sim.simulations[observables.index('Phosphorylated_cFos'), exp.t2, sim.conditions.index('HRG')]/norm_max, 
-            exp.experiments[observables.index('Phosphorylated_cFos')]['HRG']
-        )
-        '''
-        return np.sum(error)
-    else:
-        return np.inf
\ No newline at end of file
+    return _local.objective(indiv_gene, *args, solver_options=solver_options)
@@ -1,14 +1,37 @@
+from bisect import bisect_right
+
+import numpy as np
+
 from .name2idx import C, V
 
 
 class DifferentialEquation(object):
+    n_reactions = 63
+
+    # d[ppMEKc]/dt is given as a piecewise-constant input, which changes at
+    # the breakpoints (Unit: sec.). The solver does not step across them.
+    breakpoints = (300., 600., 900., 1200., 1800., 2700., 3600.)
+
+    input_schedule = {
+        # EGF=10nM
+        'EGF': (0.00258, -0.00111, -0.000625, -0.000135, -0.000135,
+                -0.0000480, -0.00000852, -0.00000728),
+        # HRG=10nM
+        'HRG': (0.00288, 0.000451, -0.000545, 0.0000522, 0.0000522,
+                0.0000399, -0.0000500, -0.0000478),
+    }
+
     def __init__(self, perturbation):
         self.perturbation = perturbation
+        self._v = np.zeros(self.n_reactions+1)
 
     # Refined Model
-    def diffeq(self, t, y, x):
-        v = {}
-        # Rate equations
+    def flux(self, t, y, x, v):
+        """Rate equations, written into the preallocated flux vector v.
+
+        v[0] is unused so that v[i] corresponds to reaction i in
+        ReactionNetwork.
+        """
         v[1] = x[C.V1] * x[C.a] * y[V.ppMEKc] * y[V.ERKc] /  ( x[C.Km1] * (1 + y[V.pERKc] / x[C.Km2]) + y[V.ERKc] )
         v[2] = x[C.V2] * x[C.a] * y[V.ppMEKc] * y[V.pERKc] /  ( x[C.Km2] * (1 + y[V.ERKc] / x[C.Km1]) + y[V.pERKc] )
         v[3] = x[C.V3] * y[V.pERKc] /  ( x[C.Km3] * (1 + y[V.ppERKc] / x[C.Km4]) + y[V.pERKc] )
@@ -72,87 +95,81 @@ class DifferentialEquation(object):
         v[61] = x[C.p61] * y[V.Fc]
         v[62] = x[C.KimF] * y[V.Fc] - x[C.KexF] * (x[C.Vn]/x[C.Vc]) * y[V.Fn]
         v[63] = x[C.p63] * y[V.Fn]
-        
+
+        return v
+
+    def stoichiometry(self, x):
+        """Stoichiometric matrix S such that dydt = S @ v.
+        """
+        c2n = x[C.Vc] / x[C.Vn]  # cytoplasm -> nucleus
+        n2c = x[C.Vn] / x[C.Vc]  # nucleus -> cytoplasm
+
+        S = np.zeros((V.NUM, self.n_reactions+1))
+        S[V.CREBn, [27, 28]] = [-1, 1]
+        S[V.pCREBn, [27, 28]] = [1, -1]
+        S[V.ERKc, [1, 3, 7]] = [-1, 1, -1]
+        S[V.ERKn, [5, 7, 50, 51, 55, 56]] = [1, c2n, 1, -1, 1, -1]
+        S[V.pERKc, [1, 2, 3, 4, 8]] = [1, -1, -1, 1, -1]
+        S[V.pERKn, [5, 6, 8, 48, 49, 53, 54]] = [-1, 1, c2n, 1, -1, 1, -1]
+        S[V.ppERKc, [2, 4, 9]] = [1, -1, -1]
+        S[V.ppERKn, [6, 9, 47, 52]] = [-1, c2n, -1, -1]
+        S[V.Elk1n, [29, 30]] = [-1, 1]
+        S[V.pElk1n, [29, 30]] = [1, -1]
+        S[V.cFOSc, [34, 35, 36, 37, 38, 40]] = [1, -1, -1, 1, -1, -1]
+        S[V.cFOSn, [40, 42, 43, 44, 45]] = [c2n, -1, -1, 1, -1]
+        S[V.pcFOSc, [35, 36, 37, 39, 41]] = [1, 1, -1, -1, -1]
+        S[V.pcFOSn, [41, 42, 43, 44, 46]] = [c2n, 1, 1, -1, -1]
+        S[V.DUSPc, [13, 14, 15, 16, 18]] = [1, -1, 1, -1, -1]
+        S[V.DUSPn, [18, 20, 21, 22, 47, 48, 49, 50, 51]] = [c2n, -1, 1, -1, -1, 1, -1, 1, -1]
+        S[V.pDUSPc, [14, 15, 17, 19]] = [1, -1, -1, -1]
+        S[V.pDUSPn, [19, 20, 21, 23, 52, 53, 54, 55, 56]] = [c2n, 1, -1, -1, -1, 1, -1, 1, -1]
+        S[V.DUSPn_ERKn, [51]] = [1]
+        S[V.DUSPn_pERKn, [49, 50]] = [1, -1]
+        S[V.DUSPn_ppERKn, [47, 48]] = [1, -1]
+        S[V.pDUSPn_ERKn, [56]] = [1]
+        S[V.pDUSPn_pERKn, [54, 55]] = [1, -1]
+        S[V.pDUSPn_ppERKn, [52, 53]] = [1, -1]
+        S[V.RSKc, [24, 25]] = [-1, 1]
+        S[V.pRSKc, [24, 25, 26]] = [1, -1, -1]
+        S[V.pRSKn, [26]] = [c2n]
+        S[V.PrecfosmRNAn, [31, 32]] = [1, -1]
+        S[V.PreduspmRNAn, [10, 11]] = [1, -1]
+        S[V.cfosmRNAc, [32, 33]] = [n2c, -1]
+        S[V.duspmRNAc, [11, 12]] = [n2c, -1]
+        S[V.Fc, [60, 61, 62]] = [1, -1, -1]
+        S[V.Fn, [62, 63]] = [c2n, -1]
+        S[V.FmRNAc, [58, 59]] = [n2c, -1]
+        S[V.PreFmRNAn, [57, 58]] = [1, -1]
+
+        return S
+
+    def diffeq(self, t, y, x):
+        v = self.flux(t, y, x, self._v)
+
         if self.perturbation:
             for i, dv in self.perturbation.items():
                 v[i] = v[i] * dv
 
-        dydt = [0] * V.NUM
-
-        if x[C.Ligand] == x[C.EGF]:  # EGF=10nM
-            if t < 300.:
-                dydt[V.ppMEKc] = 0.00258
-            elif t < 600.:
-                dydt[V.ppMEKc] = -0.00111
-            elif t < 900.:
-                dydt[V.ppMEKc] = -0.000625
-            elif t < 1200.:
-                dydt[V.ppMEKc] = -0.000135
-            elif t < 1800.:
-                dydt[V.ppMEKc] = -0.000135
-            elif t < 2700.:
-                dydt[V.ppMEKc] = -0.0000480
-            elif t < 3600.:
-                dydt[V.ppMEKc] = -0.00000852
-            elif t <= 5400.:
-                dydt[V.ppMEKc] = -0.00000728
-
-        elif x[C.Ligand] == x[C.HRG]:  # HRG=10nM
-            if t < 300.:
-                dydt[V.ppMEKc] = 0.00288
-            elif t < 600.:
-                dydt[V.ppMEKc] = 0.000451
-            elif t < 900.:
-                dydt[V.ppMEKc] = -0.000545
-            elif t < 1200.:
-                dydt[V.ppMEKc] = 0.0000522
-            elif t < 1800.:
-                dydt[V.ppMEKc] = 0.0000522
-            elif t < 2700.:
-                dydt[V.ppMEKc] = 0.0000399
-            elif t < 3600.:
-                dydt[V.ppMEKc] = -0.0000500
-            elif t <= 5400.:
-                dydt[V.ppMEKc] = -0.0000478
-        
-        else:  # Default: No ligand input
-            dydt[V.ppMEKc] = 0.0
-
-        dydt[V.CREBn] = -v[27] + v[28]
-        dydt[V.pCREBn] = v[27] - v[28]
-        dydt[V.ERKc] = -v[1] + v[3] - v[7]
-        dydt[V.ERKn] = v[5] + v[7]*(x[C.Vc]/x[C.Vn]) + v[50] -v[51] + v[55] -v[56]
-        dydt[V.pERKc] = v[1] - v[2] -v[3] +v[4]-v[8]
-        dydt[V.pERKn] = -v[5] + v[6] + v[8]*(x[C.Vc]/x[C.Vn]) + v[48] - v[49] + v[53] - v[54]
-        dydt[V.ppERKc] =  v[2] - v[4] - v[9]
-        dydt[V.ppERKn] = -v[6] + v[9]*(x[C.Vc]/x[C.Vn]) - v[47] - v[52]
-        dydt[V.Elk1n] = -v[29] + v[30]
-        dydt[V.pElk1n] = v[29] - v[30]
-        dydt[V.cFOSc] = v[34] - v[35] - v[36] + v[37] - v[38] - v[40]
-        dydt[V.cFOSn] = v[40]*(x[C.Vc]/x[C.Vn]) - v[42] - v[43] + v[44] - v[45]
-        dydt[V.pcFOSc] = v[35] + v[36] - v[37] - v[39] - v[41]
-        dydt[V.pcFOSn] = v[41]*(x[C.Vc]/x[C.Vn]) + v[42] + v[43] - v[44] - v[46]
-        dydt[V.DUSPc] = v[13] - v[14] + v[15] - v[16] - v[18]
-        dydt[V.DUSPn] = v[18]*(x[C.Vc]/x[C.Vn]) - v[20] + v[21] - v[22] - v[47] + v[48] - v[49] + v[50] - v[51]
-        dydt[V.pDUSPc] = v[14] - v[15] - v[17] - v[19]
-        dydt[V.pDUSPn] = v[19]*(x[C.Vc]/x[C.Vn]) + v[20] - v[21] - v[23] - v[52] + v[53] - v[54] + v[55] - v[56]
-        dydt[V.DUSPn_ERKn] = v[51]
-        dydt[V.DUSPn_pERKn] = v[49] - v[50]
-        dydt[V.DUSPn_ppERKn] = v[47] - v[48]
-        dydt[V.pDUSPn_ERKn] = v[56]
-        dydt[V.pDUSPn_pERKn] = v[54] - v[55]
-        dydt[V.pDUSPn_ppERKn] = v[52] - v[53]
-        dydt[V.RSKc] = -v[24] + v[25]
-        dydt[V.pRSKc] = v[24] - v[25] - v[26]
-        dydt[V.pRSKn] = v[26]*(x[C.Vc]/x[C.Vn])
-        dydt[V.PrecfosmRNAn] = v[31] - v[32]
-        dydt[V.PreduspmRNAn] = v[10] - v[11]
-        dydt[V.cfosmRNAc] = v[32]*(x[C.Vn]/x[C.Vc]) - v[33]
-        dydt[V.duspmRNAc] = v[11]*(x[C.Vn]/x[C.Vc]) - v[12]
-        dydt[V.Fc] = v[60] - v[61] - v[62]
-        dydt[V.Fn] = v[62]*(x[C.Vc]/x[C.Vn]) - v[63]
-        dydt[V.FmRNAc] = v[58]*(x[C.Vn]/x[C.Vc]) - v[59]
-        dydt[V.PreFmRNAn] = v[57] - v[58]
+        # Built once per integration if x is a biomass.solver.ParameterSet.
+        S = getattr(x, 'stoichiometric_matrix', None)
+        if S is None:
+            S = self.stoichiometry(x)
+        dydt = S.dot(v)
+
+        return self.inputs(t, x, dydt)
+
+    def inputs(self, t, x, dydt):
+        """Terms of dydt that are not expressed through flux.
+
+        x[i] and dydt[i] may also be rows over an ensemble of parameter sets
+        (see biomass.solver.solve_ensemble), hence no branching on x.
+        """
+        k = bisect_right(self.breakpoints, t)
+        egf = x[C.Ligand] == x[C.EGF]
+        hrg = x[C.Ligand] == x[C.HRG]
+        # EGF, else HRG, else no ligand input.
+        dydt[V.ppMEKc] = egf * self.input_schedule['EGF'][k] \
+            + (hrg > egf) * self.input_schedule['HRG'][k]
 
         return dydt
 
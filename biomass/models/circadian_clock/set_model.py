@@ -1,122 +1,119 @@
+import numpy as np
+
 from .name2idx import C, V
 
 
 class DifferentialEquation(object):
     """Kinetic equations
     """
+    n_reactions = 52
+
+    # Time points at which the right-hand side is discontinuous, e.g., due to
+    # piecewise-constant inputs. The solver does not step across them.
+    breakpoints = ()
+
     def __init__(self, perturbation):
         self.perturbation = perturbation
+        self._v = np.zeros(self.n_reactions+1)
+
+    def flux(self, t, y, x, v):
+        """Rate equations, written into the preallocated flux vector v.
+        """
+        # mRNAs
+        v[1] = x[C.cvsP]*(y[V.BN]**x[C.cn]) / (x[C.cKAP]**x[C.cn] + y[V.BN]**x[C.cn])
+        v[2] = x[C.cvmP] * y[V.MP] / (x[C.cKmP] + y[V.MP])
+        v[3] = x[C.ckdmp] * y[V.MP]
+        v[4] = x[C.cvsC]*(y[V.BN]**x[C.cn]) / (x[C.cKAC]**x[C.cn] + y[V.BN]**x[C.cn])
+        v[5] = x[C.cvmC] * y[V.MC] / (x[C.cKmC] + y[V.MC])
+        v[6] = x[C.ckdmc] * y[V.MC]
+        v[7] = x[C.cvsB]*(x[C.cKIB]**x[C.cm]) / (x[C.cKIB]**x[C.cm] + y[V.BN]**x[C.cm])
+        v[8] = x[C.cvmB] * y[V.MB] / (x[C.cKmB] + y[V.MB])
+        v[9] = x[C.ckdmb] * y[V.MB]
+        # PER and CRY
+        v[10] = x[C.cksP] * y[V.MP]
+        v[11] = x[C.cV1P] * y[V.PC] / (x[C.cKp] + y[V.PC])
+        v[12] = x[C.cV2P] * y[V.PCP] / (x[C.cKdp] + y[V.PCP])
+        v[13] = x[C.ck4] * y[V.PCC]
+        v[14] = x[C.ck3] * y[V.PC] * y[V.CC]
+        v[15] = x[C.ckdn] * y[V.PC]
+        v[16] = x[C.cksC] * y[V.MC]
+        v[17] = x[C.cV1C] * y[V.CC] / (x[C.cKp] + y[V.CC])
+        v[18] = x[C.cV2C] * y[V.CCP] / (x[C.cKdp] + y[V.CCP])
+        v[19] = x[C.ckdnc] * y[V.CC]
+        v[20] = x[C.cvdPC] * y[V.PCP] / (x[C.cKd] + y[V.PCP])
+        v[21] = x[C.ckdn] * y[V.PCP]
+        v[22] = x[C.cvdCC] * y[V.CCP] / (x[C.cKd] + y[V.CCP])
+        v[23] = x[C.ckdn] * y[V.CCP]
+        # PER-CRY complex
+        v[24] = x[C.cV1PC] * y[V.PCC] / (x[C.cKp] + y[V.PCC])
+        v[25] = x[C.cV2PC] * y[V.PCCP] / (x[C.cKdp] + y[V.PCCP])
+        v[26] = x[C.ck2] * y[V.PCN]
+        v[27] = x[C.ck1] * y[V.PCC]
+        v[28] = x[C.ckdn] * y[V.PCC]
+        v[29] = x[C.cV3PC] * y[V.PCN] / (x[C.cKp] + y[V.PCN])
+        v[30] = x[C.cV4PC] * y[V.PCNP] / (x[C.cKdp] + y[V.PCNP])
+        v[31] = x[C.ck7] * y[V.BN] * y[V.PCN]
+        v[32] = x[C.ck8] * y[V.IN]
+        v[33] = x[C.ckdn] * y[V.PCN]
+        v[34] = x[C.cvdPCC] * y[V.PCCP] / (x[C.cKd] + y[V.PCCP])
+        v[35] = x[C.ckdn] * y[V.PCCP]
+        v[36] = x[C.cvdPCN] * y[V.PCNP] / (x[C.cKd] + y[V.PCNP])
+        v[37] = x[C.ckdn] * y[V.PCNP]
+        # BMAL1
+        v[38] = x[C.cksB] * y[V.MB]
+        v[39] = x[C.cV1B] * y[V.BC] / (x[C.cKp] + y[V.BC])
+        v[40] = x[C.cV2B] * y[V.BCP] / (x[C.cKdp] + y[V.BCP])
+        v[41] = x[C.ck5] * y[V.BC]
+        v[42] = x[C.ck6] * y[V.BN]
+        v[43] = x[C.ckdn] * y[V.BC]
+        v[44] = x[C.cvdBC] * y[V.BCP] / (x[C.cKd] + y[V.BCP])
+        v[45] = x[C.ckdn] * y[V.BCP]
+        v[46] = x[C.cV3B] * y[V.BN] / (x[C.cKp] + y[V.BN])
+        v[47] = x[C.cV4B] * y[V.BNP] / (x[C.cKdp] + y[V.BNP])
+        v[48] = x[C.ckdn] * y[V.BN]
+        v[49] = x[C.cvdBN] * y[V.BNP] / (x[C.cKd] + y[V.BNP])
+        v[50] = x[C.ckdn] * y[V.BNP]
+        # Inactive complex between PER-CRY and CLOCK-BMAL1
+        v[51] = x[C.cvdIN] * y[V.IN] / (x[C.cKd] + y[V.IN])
+        v[52] = x[C.ckdn] * y[V.IN]
+
+        return v
+
+    def stoichiometry(self, x):
+        """Stoichiometric matrix S such that dydt = S @ v.
+        """
+        S = np.zeros((V.NUM, self.n_reactions+1))
+        S[V.MP, [1, 2, 3]] = [1, -1, -1]
+        S[V.MC, [4, 5, 6]] = [1, -1, -1]
+        S[V.MB, [7, 8, 9]] = [1, -1, -1]
+        S[V.PC, [10, 11, 12, 13, 14, 15]] = [1, -1, 1, 1, -1, -1]
+        S[V.CC, [16, 17, 18, 13, 14, 19]] = [1, -1, 1, 1, -1, -1]
+        S[V.PCP, [11, 12, 20, 21]] = [1, -1, -1, -1]
+        S[V.CCP, [17, 18, 22, 23]] = [1, -1, -1, -1]
+        S[V.PCC, [24, 25, 13, 14, 26, 27, 28]] = [-1, 1, -1, 1, 1, -1, -1]
+        S[V.PCN, [29, 30, 26, 27, 31, 32, 33]] = [-1, 1, -1, 1, -1, 1, -1]
+        S[V.PCCP, [24, 25, 34, 35]] = [1, -1, -1, -1]
+        S[V.PCNP, [29, 30, 36, 37]] = [1, -1, -1, -1]
+        S[V.BC, [38, 39, 40, 41, 42, 43]] = [1, -1, 1, -1, 1, -1]
+        S[V.BCP, [39, 40, 44, 45]] = [1, -1, -1, -1]
+        S[V.BN, [46, 47, 41, 42, 31, 32, 48]] = [-1, 1, 1, -1, -1, 1, -1]
+        S[V.BNP, [46, 47, 49, 50]] = [1, -1, -1, -1]
+        S[V.IN, [32, 31, 51, 52]] = [-1, 1, -1, -1]
+
+        return S
 
     def diffeq(self, t, y, x):
-        dydt = [0] * V.NUM
-        dydt[V.MP] = (
-            + x[C.cvsP]*(y[V.BN]**x[C.cn]) / (x[C.cKAP]**x[C.cn] + y[V.BN]**x[C.cn])
-            - x[C.cvmP] * y[V.MP] / (x[C.cKmP] + y[V.MP])
-            - x[C.ckdmp] * y[V.MP]
-        )
-        dydt[V.MC] = (
-            + x[C.cvsC]*(y[V.BN]**x[C.cn]) / (x[C.cKAC]**x[C.cn] + y[V.BN]**x[C.cn])
-            - x[C.cvmC] * y[V.MC] / (x[C.cKmC] + y[V.MC]) 
-            - x[C.ckdmc] * y[V.MC]
-        )
-        dydt[V.MB] = (
-            + x[C.cvsB]*(x[C.cKIB]**x[C.cm]) / (x[C.cKIB]**x[C.cm] 
-            + y[V.BN]**x[C.cm])
-            - x[C.cvmB] * y[V.MB] / (x[C.cKmB] + y[V.MB]) 
-            - x[C.ckdmb] * y[V.MB]
-        )
-        dydt[V.PC] = (
-            + x[C.cksP] * y[V.MP] 
-            - x[C.cV1P] * y[V.PC] / (x[C.cKp] + y[V.PC])
-            + x[C.cV2P] * y[V.PCP] / (x[C.cKdp] + y[V.PCP]) 
-            + x[C.ck4] * y[V.PCC]
-            - x[C.ck3] * y[V.PC] * y[V.CC] - x[C.ckdn] * y[V.PC]
-        )
-        dydt[V.CC] = (
-            + x[C.cksC] * y[V.MC] 
-            - x[C.cV1C] * y[V.CC] / (x[C.cKp] + y[V.CC])
-            + x[C.cV2C] * y[V.CCP] / (x[C.cKdp] + y[V.CCP]) 
-            + x[C.ck4] * y[V.PCC]
-            - x[C.ck3] * y[V.PC] * y[V.CC] 
-            - x[C.ckdnc] * y[V.CC]
-        )
-        dydt[V.PCP] = (
-            + x[C.cV1P] * y[V.PC] / (x[C.cKp] + y[V.PC]) 
-            - x[C.cV2P] * y[V.PCP] / (x[C.cKdp] + y[V.PCP])
-            - x[C.cvdPC] * y[V.PCP] / (x[C.cKd] + y[V.PCP]) 
-            - x[C.ckdn] * y[V.PCP]
-        )
-        dydt[V.CCP] = (
-            + x[C.cV1C] * y[V.CC] / (x[C.cKp] + y[V.CC]) 
-            - x[C.cV2C] * y[V.CCP] / (x[C.cKdp] + y[V.CCP])
-            - x[C.cvdCC] * y[V.CCP] / (x[C.cKd] + y[V.CCP]) 
-            - x[C.ckdn] * y[V.CCP]
-        )
-        dydt[V.PCC] = (
-            - x[C.cV1PC] * y[V.PCC] / (x[C.cKp] + y[V.PCC]) 
-            + x[C.cV2PC] * y[V.PCCP] / (x[C.cKdp] + y[V.PCCP]) 
-            - x[C.ck4] * y[V.PCC] 
-            + x[C.ck3] * y[V.PC] * y[V.CC] 
-            + x[C.ck2] * y[V.PCN] 
-            - x[C.ck1] * y[V.PCC] 
-            - x[C.ckdn] * y[V.PCC]
-        )
-        dydt[V.PCN] = (
-            - x[C.cV3PC] * y[V.PCN] / (x[C.cKp] + y[V.PCN]) 
-            + x[C.cV4PC] * y[V.PCNP] / (x[C.cKdp] + y[V.PCNP])
-            - x[C.ck2] * y[V.PCN] 
-            + x[C.ck1] * y[V.PCC] 
-            - x[C.ck7] * y[V.BN] * y[V.PCN]
-            + x[C.ck8] * y[V.IN] 
-            - x[C.ckdn] * y[V.PCN]
-        )
-        dydt[V.PCCP] = (
-            + x[C.cV1PC] * y[V.PCC] / (x[C.cKp] + y[V.PCC]) 
-            - x[C.cV2PC] * y[V.PCCP] / (x[C.cKdp] + y[V.PCCP])
-            - x[C.cvdPCC] * y[V.PCCP] / (x[C.cKd] + y[V.PCCP]) 
-            - x[C.ckdn] * y[V.PCCP]
-        )
-        dydt[V.PCNP] = (
-            + x[C.cV3PC] * y[V.PCN] / (x[C.cKp] + y[V.PCN]) 
-            - x[C.cV4PC] * y[V.PCNP] / (x[C.cKdp] + y[V.PCNP])
-            - x[C.cvdPCN] * y[V.PCNP] / (x[C.cKd] + y[V.PCNP]) 
-            - x[C.ckdn] * y[V.PCNP]
-        )
-        dydt[V.BC] = (
-            + x[C.cksB] * y[V.MB] 
-            - x[C.cV1B] * y[V.BC] / (x[C.cKp] + y[V.BC])
-            + x[C.cV2B] * y[V.BCP] / (x[C.cKdp] + y[V.BCP]) 
-            - x[C.ck5] * y[V.BC]
-            + x[C.ck6] * y[V.BN] 
-            - x[C.ckdn] * y[V.BC]
-        )
-        dydt[V.BCP] = (
-            + x[C.cV1B] * y[V.BC] / (x[C.cKp] + y[V.BC]) 
-            - x[C.cV2B] * y[V.BCP] / (x[C.cKdp] + y[V.BCP])
-            - x[C.cvdBC] * y[V.BCP] / (x[C.cKd] + y[V.BCP]) 
-            - x[C.ckdn] * y[V.BCP]
-        )
-        dydt[V.BN] = (
-            - x[C.cV3B] * y[V.BN] / (x[C.cKp] + y[V.BN]) 
-            + x[C.cV4B] * y[V.BNP] / (x[C.cKdp] + y[V.BNP])
-            + x[C.ck5] * y[V.BC] 
-            - x[C.ck6] * y[V.BN] 
-            - x[C.ck7] * y[V.BN] * y[V.PCN]
-            + x[C.ck8] * y[V.IN] 
-            - x[C.ckdn] * y[V.BN]
-        )
-        dydt[V.BNP] = (
-            + x[C.cV3B] * y[V.BN] / (x[C.cKp] + y[V.BN]) 
-            - x[C.cV4B] * y[V.BNP] / (x[C.cKdp] + y[V.BNP])
-            - x[C.cvdBN] * y[V.BNP] / (x[C.cKd] + y[V.BNP]) 
-            - x[C.ckdn] * y[V.BNP]
-        )
-        dydt[V.IN] = (
-            - x[C.ck8] * y[V.IN] 
-            + x[C.ck7] * y[V.BN] * y[V.PCN]
-            - x[C.cvdIN] * y[V.IN] / (x[C.cKd] + y[V.IN]) 
-            - x[C.ckdn] * y[V.IN]
-        )
+        v = self.flux(t, y, x, self._v)
+
+        if self.perturbation:
+            for i, dv in self.perturbation.items():
+                v[i] = v[i] * dv
+
+        # Built once per integration if x is a biomass.solver.ParameterSet.
+        S = getattr(x, 'stoichiometric_matrix', None)
+        if S is None:
+            S = self.stoichiometry(x)
+        dydt = S.dot(v)
 
         return dydt
 
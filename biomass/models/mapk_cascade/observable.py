@@ -1,6 +1,10 @@
+import os
+
 import numpy as np
-from scipy.integrate import ode
 
+from biomass.solver import (get_jacobian, get_steady_state, solve_ode,
+                            solve_ensemble, SteadyStateCache, load_method,
+                            jit_compile, ParameterSet)
 from .name2idx import C, V
 from .set_model import DifferentialEquation
 
@@ -11,7 +15,7 @@ observables = [
 ]
 
 class NumericalSimulation(DifferentialEquation):
-    """ Simulate a model using scipy.integrate.ode
+    """ Simulate a model using scipy.integrate.odeint
 
     Attributes
     ----------
@@ -19,10 +23,53 @@ class NumericalSimulation(DifferentialEquation):
         if True, simulation results in each observable are divided by their 
         maximum values.
 
+    steady_state_cache : biomass.solver.SteadyStateCache or None
+        Steady states of previous simulations, used as warm starts if
+        warm_start.
+
+    solver_options : dict
+        Keyword arguments of biomass.solver.solve_ode. The integrator is the
+        one recorded by biomass.calibrate_solver, LSODA by default.
+
+    jit : bool
+        If True, flux is compiled with Numba (see biomass.solver.jit_compile)
+        when the simulation is created. Set it on the class, i.e.,
+        NumericalSimulation.jit = True, to compile the simulations of the
+        objective function as well. Ignored if Numba is not installed.
+
+    sparse : bool
+        If True, the Jacobian is a sparse matrix (see
+        biomass.solver.get_jacobian), for models with hundreds of species
+        integrated by 'radau' or 'bdf'. Set it on the class like jit.
+
+    warm_start : bool
+        If True, each steady state is solved for starting from that of the
+        nearest parameter vector simulated before. This is faster, but the
+        result then depends on which parameter vectors were simulated
+        earlier. Set it on the class like jit.
+
+    joint_conditions : bool
+        If True, all conditions are integrated together as one
+        block-diagonal system (see biomass.solver.solve_ensemble) instead of
+        one after another, which pays off for many conditions.
+
     """
+    jit = False
+    sparse = False
+    warm_start = False
+    joint_conditions = False
+
     def __init__(self):
         super().__init__(perturbation={})
         self.normalization = False
+        self.jac = get_jacobian(self, V.NUM, C.NUM, sparse=self.sparse)
+        self.steady_state_cache = SteadyStateCache() if self.warm_start \
+            else None
+        if self.jit:
+            jit_compile(self, V.NUM, C.NUM)
+        self.solver_options = {
+            'method': load_method(os.path.dirname(__file__))
+        }
 
     t = range(150*60+1)
 
@@ -31,77 +78,180 @@ class NumericalSimulation(DifferentialEquation):
 
     simulations = np.empty((len(observables), len(t), len(conditions)))
 
-    def simulate(self, x, y0, _perturbation={}):
+    def simulate(self, x, y0, _perturbation={}, timepoints=None):
+        """
+        Parameters
+        ----------
+        timepoints : list of int, optional
+            Fitting mode. Instead of the full time course in simulations,
+            only the indices of t listed in timepoints are recorded in
+            simulations_fit (observables x timepoints x conditions), and the
+            maximum of each observable over the integrated time points and
+            all conditions (the whole time course if normalization) in
+            simulations_max. With normalization, every point of t is still
+            integrated for the maximum, and only the copy into simulations
+            is saved. Without it, only timepoints are integrated, but the
+            integrators interpolate their output, so this hardly changes the
+            cost of the integration either (e.g., 9 instead of 5401 points
+            take about as long for Nakakuki_Cell_2010 under LSODA).
+
+        """
         if _perturbation:
             self.perturbation = _perturbation
+        if timepoints is None:
+            tspan = self.t
+        else:
+            (tspan, fitting_idx) = self._fitting_tspan(timepoints)
+            self.simulations_fit = np.empty(
+                (len(observables), len(timepoints), len(self.conditions))
+            )
+            self.simulations_max = np.full(len(observables), -np.inf)
+        X = [
+            self._condition_params(x, condition)
+            for condition in self.conditions
+        ]
+        if self.joint_conditions:
+            Y_all = self._solveode_ensemble(
+                np.tile(y0, (len(X), 1)), tspan, X
+            )
         for i, condition in enumerate(self.conditions):
-            if condition == 'control':
-                pass
-            '''
-            elif condition == 'cooperative':
-                x[C.n] = 2
-                x[C.KI] = 18
-                x[C.K1] = 50
-                x[C.K2] = 40
-                x[C.K3] = 100
-                x[C.K4] = 100
-                x[C.K5] = 100
-                x[C.K6] = 100
-                x[C.K7] = 100
-                x[C.K8] = 100
-                x[C.K9] = 100
-                x[C.K10] = 100
-                x[C.V9] = 1.25
-                x[C.V10] = 1.25
-            '''
-            
-            (T, Y) = self._solveode(self.diffeq, y0, self.t, tuple(x))
-
-            if T[-1] < self.t[-1]:
+            if self.joint_conditions:
+                Y = Y_all[i]
+                failed = not np.all(np.isfinite(Y))
+            else:
+                (T, Y) = self._solveode(self.diffeq, y0, tspan, tuple(X[i]))
+                failed = T[-1] < tspan[-1]
+
+            if failed:
                 return False
+            elif timepoints is None:
+                self._get_observables(Y, X[i], self.simulations[:, :, i])
             else:
-                self.simulations[observables.index('biphosphorylated_MAPK'), :, i] = (
-                    Y[:, V.MAPK_PP]
+                sim = self._get_observables(
+                    Y, X[i], np.empty((len(observables), len(tspan)))
                 )
-                self.simulations[observables.index('unphosphorylated_MAPK'), :, i] = (
-                    Y[:, V.MAPK]
+                self.simulations_fit[:, :, i] = sim[:, fitting_idx]
+                self.simulations_max = np.maximum(
+                    self.simulations_max, np.max(sim, axis=1)
                 )
 
-    def _solveode(self, diffeq, y0, tspan, args):
-        dt = (self.t[-1] - self.t[0]) / (len(self.t) - 1)
-        sol = ode(diffeq)
-        sol.set_integrator(
-            'vode', method='bdf', with_jacobian=True,
-            atol=1e-9, rtol=1e-9, min_step=1e-8
+    def simulate_ensemble(self, X, Y0, _perturbation={}):
+        """ Simulate an ensemble of parameter sets, integrated together.
+
+        Parameters
+        ----------
+        X : array_like
+            Parameter values of shape (n_sets, C.NUM).
+
+        Y0 : array_like
+            Initial values of shape (n_sets, V.NUM), or (V.NUM,) if they are
+            shared by all sets.
+
+        Returns
+        -------
+        simulations : numpy array
+            (n_sets, observables, t, conditions). NaN for the sets whose
+            simulation failed.
+
+        """
+        if _perturbation:
+            self.perturbation = _perturbation
+        X = np.array(X, dtype=float)
+        Y0 = np.array(
+            np.broadcast_to(np.asarray(Y0, dtype=float), (len(X), V.NUM))
+        )
+        simulations = np.full(
+            (len(X), len(observables), len(self.t), len(self.conditions)),
+            np.nan
         )
-        sol.set_initial_value(y0, tspan[0])
-        sol.set_f_params(args)
+        for i, condition in enumerate(self.conditions):
+            X_i = np.array([self._condition_params(x, condition) for x in X])
+            Y = self._solveode_ensemble(Y0, self.t, X_i)
+            for k, x in enumerate(X_i):
+                self._get_observables(Y[k], x, simulations[k, :, :, i])
+
+        return simulations
 
-        T = [tspan[0]]
-        Y = [y0]
+    def _condition_params(self, x, condition):
+        """ Parameter values under condition, as a new list; x is not
+        modified, so that the overrides of one condition do not carry over
+        to the next.
+        """
+        x = list(x)
+        if condition == 'control':
+            pass
+        '''
+        elif condition == 'cooperative':
+            x[C.n] = 2
+            x[C.KI] = 18
+            x[C.K1] = 50
+            x[C.K2] = 40
+            x[C.K3] = 100
+            x[C.K4] = 100
+            x[C.K5] = 100
+            x[C.K6] = 100
+            x[C.K7] = 100
+            x[C.K8] = 100
+            x[C.K9] = 100
+            x[C.K10] = 100
+            x[C.V9] = 1.25
+            x[C.V10] = 1.25
+        '''
 
-        while sol.successful() and sol.t < tspan[-1]:
-            sol.integrate(sol.t+dt)
-            T.append(sol.t)
-            Y.append(sol.y)
+        return x
 
-        return np.array(T), np.array(Y)
-    
-    def _get_steady_state(self, diffeq, y0, args, eps=1e-6):
+    def _get_observables(self, Y, x, sim):
+        """Map the solution Y (time x species) onto observables, written into
+        sim (observables x time).
         """
-        Run until a time t for which the maximal absolutevalue of the 
-        regularized relative derivative was smaller than eps.
+        sim[observables.index('biphosphorylated_MAPK'), :] = (
+            Y[:, V.MAPK_PP]
+        )
+        sim[observables.index('unphosphorylated_MAPK'), :] = (
+            Y[:, V.MAPK]
+        )
+
+        return sim
+
+    def _fitting_tspan(self, timepoints):
+        """Time points to integrate in fitting mode and the positions of
+        timepoints among them.
         """
-        while True:
-            (T, Y) = self._solveode(diffeq, y0, range(2), args)
-            if T[-1] < 1:
-                return None
-            elif np.max(np.abs((Y[-1, :] - y0) / (np.array(y0) + eps))) < eps:
-                break
-            else:
-                y0 = Y[-1, :].tolist()
+        if self.normalization:
+            # The maximum over the whole time course is needed.
+            idx = np.arange(len(self.t))
+        else:
+            idx = np.union1d(timepoints, [0, len(self.t)-1]).astype(int)
 
-        return y0
+        return [self.t[k] for k in idx], np.searchsorted(idx, timepoints)
+
+    def _solveode(self, diffeq, y0, tspan, args):
+        args = ParameterSet(args, self.stoichiometry(args))
+        return solve_ode(
+            diffeq, y0, tspan, args, jac=self.jac, nonnegative=True,
+            breakpoints=self.breakpoints, **self.solver_options
+        )
+
+    def _solveode_ensemble(self, Y0, tspan, X):
+        return solve_ensemble(
+            self, Y0, tspan, X, jac=self.jac, nonnegative=True,
+            breakpoints=self.breakpoints, **self.solver_options
+        )
+
+    def _get_steady_state(self, diffeq, y0, args, eps=1e-6):
+        """
+        Find the state for which the maximal absolute value of the
+        regularized relative derivative is smaller than eps, by damped Newton
+        iteration (pseudo-transient continuation) on diffeq, falling back to
+        integration. If warm_start, equilibrations start from the steady
+        state of the nearest parameter vector in steady_state_cache.
+        """
+        args = ParameterSet(args, self.stoichiometry(args))
+        return get_steady_state(
+            diffeq, y0, args, jac=self.jac, eps=eps,
+            cache=self.steady_state_cache,
+            stoichiometry=args.stoichiometric_matrix
+        )
 
 class ExperimentalData(object):
     def __init__(self):
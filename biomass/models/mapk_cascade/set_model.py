@@ -1,15 +1,24 @@
+import numpy as np
+
 from .name2idx import C, V
 
 
 class DifferentialEquation(object):
     """Kinetic equations comprising the computational model of the MAPK cascade.
     """
+    n_reactions = 10
+
+    # Time points at which the right-hand side is discontinuous, e.g., due to
+    # piecewise-constant inputs. The solver does not step across them.
+    breakpoints = ()
+
     def __init__(self, perturbation):
         self.perturbation = perturbation
+        self._v = np.zeros(self.n_reactions+1)
 
-    def diffeq(self, t, y, x):
-        # Rate equation
-        v = {}
+    def flux(self, t, y, x, v):
+        """Rate equations, written into the preallocated flux vector v.
+        """
         v[1] = x[C.V1] * y[V.MKKK] / ((1 + (y[V.MAPK_PP] / x[C.KI])**x[C.n]) * (x[C.K1] + y[V.MKKK]))
         v[2] = x[C.V2] * y[V.MKKK_P] / (x[C.K2] + y[V.MKKK_P])
         v[3] = x[C.k3] * y[V.MKKK_P] * y[V.MKK] / (x[C.K3] + y[V.MKK])
@@ -21,15 +30,35 @@ class DifferentialEquation(object):
         v[9] = x[C.V9] * y[V.MAPK_PP] / (x[C.K9] + y[V.MAPK_PP])
         v[10] = x[C.V10] * y[V.MAPK_P] / (x[C.K10] + y[V.MAPK_P])
 
-        dydt = [0] * V.NUM
-        dydt[V.MKKK] = v[2] - v[1]
-        dydt[V.MKKK_P] = v[1] - v[2]
-        dydt[V.MKK] = v[6] - v[3]
-        dydt[V.MKK_P] = v[3] + v[5] - v[4] - v[6]
-        dydt[V.MKK_PP] = v[4] - v[5]
-        dydt[V.MAPK] = v[10] - v[7]
-        dydt[V.MAPK_P] = v[7] + v[9] - v[8] - v[10]
-        dydt[V.MAPK_PP] = v[8] - v[9]
+        return v
+
+    def stoichiometry(self, x):
+        """Stoichiometric matrix S such that dydt = S @ v.
+        """
+        S = np.zeros((V.NUM, self.n_reactions+1))
+        S[V.MKKK, [1, 2]] = [-1, 1]
+        S[V.MKKK_P, [1, 2]] = [1, -1]
+        S[V.MKK, [3, 6]] = [-1, 1]
+        S[V.MKK_P, [3, 4, 5, 6]] = [1, -1, 1, -1]
+        S[V.MKK_PP, [4, 5]] = [1, -1]
+        S[V.MAPK, [7, 10]] = [-1, 1]
+        S[V.MAPK_P, [7, 8, 9, 10]] = [1, -1, 1, -1]
+        S[V.MAPK_PP, [8, 9]] = [1, -1]
+
+        return S
+
+    def diffeq(self, t, y, x):
+        v = self.flux(t, y, x, self._v)
+
+        if self.perturbation:
+            for i, dv in self.perturbation.items():
+                v[i] = v[i] * dv
+
+        # Built once per integration if x is a biomass.solver.ParameterSet.
+        S = getattr(x, 'stoichiometric_matrix', None)
+        if S is None:
+            S = self.stoichiometry(x)
+        dydt = S.dot(v)
 
         return dydt
 
@@ -0,0 +1,244 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+
+class ResultStore(object):
+    """ Optimization results of all paramsets in a single SQLite file.
+
+    Tables
+    ------
+    paramsets : Best individual, best fitness, the generation at which it
+        was found and the number of generations run, one row per paramset.
+    history : Every improvement of the best individual.
+
+    Parameters
+    ----------
+    out_dir : str
+        model_path + '/out'. The results are stored in out_dir/results.db.
+
+    Notes
+    -----
+    A connection is opened for each query, so the store can be shared by
+    paramsets optimized in parallel and pickled along with the GA.
+    Results written by earlier versions (out/{n}/fit_param{generation}.npy)
+    are imported the first time the store is read.
+    """
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.path = out_dir + '/results.db'
+        self._imported = False
+
+    def _connect(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=60)
+        con.execute(
+            'CREATE TABLE IF NOT EXISTS paramsets ('
+            'paramset INTEGER PRIMARY KEY, generation INTEGER, '
+            'best_fitness REAL, best_indiv BLOB, count_num INTEGER)'
+        )
+        con.execute(
+            'CREATE TABLE IF NOT EXISTS history ('
+            'paramset INTEGER, generation INTEGER, fitness REAL, indiv BLOB, '
+            'PRIMARY KEY (paramset, generation))'
+        )
+        return con
+
+    def clear(self, nth_paramset):
+        with closing(self._connect()) as con, con:
+            con.execute(
+                'DELETE FROM paramsets WHERE paramset = ?', (nth_paramset,)
+            )
+            con.execute(
+                'DELETE FROM history WHERE paramset = ?', (nth_paramset,)
+            )
+
+    def write(self, nth_paramset, count_num, best_fitness, improvements=[]):
+        """ Update the results of a paramset in a single transaction.
+
+        Parameters
+        ----------
+        nth_paramset : int
+
+        count_num : int
+            Number of generations run so far.
+
+        best_fitness : float
+
+        improvements : list of (generation, best_indiv, fitness)
+            Improvements of the best individual since the last write, in the
+            order of generation.
+
+        """
+        with closing(self._connect()) as con, con:
+            con.executemany(
+                'INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?)',
+                [
+                    (
+                        nth_paramset, int(generation), float(fitness),
+                        np.asarray(indiv, dtype=float).tobytes()
+                    ) for (generation, indiv, fitness) in improvements
+                ]
+            )
+            if improvements:
+                (generation, best_indiv, _) = improvements[-1]
+                con.execute(
+                    'INSERT OR REPLACE INTO paramsets VALUES (?, ?, ?, ?, ?)',
+                    (
+                        nth_paramset, int(generation), float(best_fitness),
+                        np.asarray(best_indiv, dtype=float).tobytes(),
+                        int(count_num)
+                    )
+                )
+            else:
+                con.execute(
+                    'UPDATE paramsets SET best_fitness = ?, count_num = ? '
+                    'WHERE paramset = ?',
+                    (float(best_fitness), int(count_num), nth_paramset)
+                )
+
+    def get_executable(self):
+        """ Paramsets that have a best individual, in ascending order.
+        """
+        self._import_npy()
+        with closing(self._connect()) as con:
+            rows = con.execute(
+                'SELECT paramset FROM paramsets ORDER BY paramset'
+            ).fetchall()
+
+        return [nth_paramset for (nth_paramset,) in rows]
+
+    def get(self, nth_paramset):
+        """
+        Returns
+        -------
+        best_indiv : numpy array
+
+        best_fitness : float
+
+        generation : int
+            Generation at which best_indiv was found.
+
+        count_num : int
+            Number of generations run.
+
+        """
+        self._import_npy()
+        with closing(self._connect()) as con:
+            row = con.execute(
+                'SELECT best_indiv, best_fitness, generation, count_num '
+                'FROM paramsets WHERE paramset = ?', (nth_paramset,)
+            ).fetchone()
+        if row is None:
+            raise ValueError(
+                'No optimization results for paramset #{:d}'.format(
+                    nth_paramset
+                )
+            )
+        (best_indiv, best_fitness, generation, count_num) = row
+
+        best_indiv = np.frombuffer(best_indiv).copy()
+
+        return best_indiv, best_fitness, generation, count_num
+
+    def get_indiv(self, nth_paramset):
+        return self.get(nth_paramset)[0]
+
+    def get_best_fitness(self, nth_paramset):
+        return self.get(nth_paramset)[1]
+
+    def get_all(self):
+        """
+        Returns
+        -------
+        paramsets : list of int
+
+        best_indivs : numpy array
+            (len(paramsets), n_gene)
+
+        best_fitness : numpy array
+            (len(paramsets),)
+
+        """
+        self._import_npy()
+        with closing(self._connect()) as con:
+            rows = con.execute(
+                'SELECT paramset, best_indiv, best_fitness '
+                'FROM paramsets ORDER BY paramset'
+            ).fetchall()
+        paramsets = [row[0] for row in rows]
+        best_indivs = np.array([np.frombuffer(row[1]) for row in rows]) \
+            if rows else np.empty((0, 0))
+        best_fitness = np.array([row[2] for row in rows], dtype=float)
+
+        return paramsets, best_indivs, best_fitness
+
+    def get_history(self, nth_paramset):
+        """
+        Returns
+        -------
+        generations : numpy array
+
+        indivs : numpy array
+            (len(generations), n_gene)
+
+        fitness : numpy array
+
+        """
+        self._import_npy()
+        with closing(self._connect()) as con:
+            rows = con.execute(
+                'SELECT generation, indiv, fitness FROM history '
+                'WHERE paramset = ? ORDER BY generation', (nth_paramset,)
+            ).fetchall()
+
+        return (
+            np.array([row[0] for row in rows], dtype=int),
+            np.array([np.frombuffer(row[1]) for row in rows]),
+            np.array([row[2] for row in rows], dtype=float)
+        )
+
+    def _import_npy(self):
+        """ Import out/{n}/*.npy written by earlier versions.
+        """
+        if self._imported or not os.path.isdir(self.out_dir):
+            return
+        self._imported = True
+        legacy = [
+            int(file) for file in os.listdir(self.out_dir)
+            if re.fullmatch(r'\d+', file) and os.path.isfile(
+                self.out_dir + '/{}/generation.npy'.format(file)
+            )
+        ]
+        if not legacy:
+            return
+        with closing(self._connect()) as con:
+            stored = set(
+                nth_paramset for (nth_paramset,) in
+                con.execute('SELECT paramset FROM paramsets').fetchall()
+            )
+        for nth_paramset in sorted(set(legacy) - stored):
+            paramset_dir = self.out_dir + '/{:d}'.format(nth_paramset)
+            best_generation = int(np.load(paramset_dir + '/generation.npy'))
+            improvements = []
+            for file in os.listdir(paramset_dir):
+                match = re.fullmatch(r'fit_param(\d+)\.npy', file)
+                if match and int(match.group(1)) <= best_generation:
+                    improvements.append(
+                        (
+                            int(match.group(1)),
+                            np.load(paramset_dir + '/' + file),
+                            np.nan
+                        )
+                    )
+            improvements.sort(key=lambda improvement: improvement[0])
+            best_fitness = np.load(paramset_dir + '/best_fitness.npy') \
+                if os.path.isfile(paramset_dir + '/best_fitness.npy') \
+                else np.inf
+            count_num = np.load(paramset_dir + '/count_num.npy') \
+                if os.path.isfile(paramset_dir + '/count_num.npy') \
+                else best_generation
+            self.write(nth_paramset, count_num, best_fitness, improvements)
@@ -0,0 +1,7 @@
+from .jacobian import get_jacobian
+from .integrate import solve_ode, BudgetExceeded
+from .parameter_set import ParameterSet
+from .steady_state import get_steady_state, SteadyStateCache
+from .calibration import calibrate_method, load_method, save_method
+from .jit import jit_compile
+from .ensemble import solve_ensemble
@@ -0,0 +1,116 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from .integrate import methods
+
+SOLVER_FILE = 'solver.json'
+
+
+def load_method(model_dir, default='lsoda'):
+    """ Integrator recorded by calibrate_method in model_dir/solver.json, or
+    default if the model has not been calibrated.
+    """
+    try:
+        with open(os.path.join(model_dir, SOLVER_FILE)) as f:
+            method = json.load(f)['method']
+    except (FileNotFoundError, KeyError, ValueError):
+        return default
+
+    return method if method in methods else default
+
+
+def _run(sim, x, y0, solver_options):
+    sim.solver_options = solver_options
+    if sim.steady_state_cache is not None:
+        sim.steady_state_cache.clear()
+    if sim.simulate(list(x), list(y0)) is False:
+        return None
+
+    return sim.simulations.copy()
+
+
+def calibrate_method(sim, x, y0, candidates=None, tolerance=1e-4,
+                     n_repeat=3):
+    """ Time each integrator on a simulation of (x, y0) and pick the fastest
+    one that agrees with a tight-tolerance reference.
+
+    Parameters
+    ----------
+    sim : NumericalSimulation
+
+    x, y0 : list
+        Default parameter values and initial conditions of the model.
+
+    candidates : list of str, optional
+        Keys of biomass.solver.integrate.methods. All of them by default.
+
+    tolerance : float
+        Maximum deviation from the reference, relative to the maximum of
+        each observable in each condition.
+
+    n_repeat : int
+        The fastest of n_repeat runs is taken as the time of a method.
+
+    Returns
+    -------
+    method : str
+        None if no candidate is accurate.
+
+    report : dict
+        {method: {'time': seconds, 'error': relative deviation}}. Both are
+        None if the simulation failed.
+
+    """
+    if candidates is None:
+        candidates = list(methods)
+    solver_options = getattr(sim, 'solver_options', {})
+    try:
+        reference = _run(
+            sim, x, y0, {
+                'method': 'lsoda', 'rtol': 1e-12, 'atol': 1e-12,
+                'min_step': 0.
+            }
+        )
+        if reference is None:
+            raise ValueError('Reference simulation failed')
+        scale = np.max(np.abs(reference), axis=1, keepdims=True)
+        scale[scale == 0.] = 1.
+        report = {}
+        for method in candidates:
+            elapsed = []
+            for _ in range(n_repeat):
+                start = time.perf_counter()
+                simulations = _run(sim, x, y0, {'method': method})
+                elapsed.append(time.perf_counter() - start)
+                if simulations is None:
+                    break
+            if simulations is None:
+                report[method] = {'time': None, 'error': None}
+            else:
+                report[method] = {
+                    'time': min(elapsed),
+                    'error': float(
+                        np.max(np.abs(simulations - reference) / scale)
+                    ),
+                }
+    finally:
+        sim.solver_options = solver_options
+        if sim.steady_state_cache is not None:
+            sim.steady_state_cache.clear()
+    accurate = [
+        method for method in candidates
+        if report[method]['error'] is not None
+        and report[method]['error'] <= tolerance
+    ]
+    method = min(accurate, key=lambda method: report[method]['time']) \
+        if accurate else None
+
+    return method, report
+
+
+def save_method(model_dir, method, report):
+    with open(os.path.join(model_dir, SOLVER_FILE), 'w') as f:
+        json.dump({'method': method, 'report': report}, f, indent=4)
@@ -0,0 +1,219 @@
+import numpy as np
+from scipy.integrate import odeint
+
+from .integrate import (_budget, _fortran_lock, _nonnegative,
+                        BudgetExceeded, solve_ode)
+from .parameter_set import ParameterSet
+
+
+class _EnsembleRHS(object):
+    """Right-hand side of the ensemble, with the states of the members
+    stored one after another (array of structures), so that the Jacobian is
+    block diagonal with a bandwidth of n_species - 1.
+
+    flux is evaluated once per call for all members: y[i] and x[j] are rows
+    over the ensemble. The parameters are bound here, and the args of the
+    integrator are ignored, as are those of _EnsembleJacobian.
+    """
+    def __init__(self, diffeq, X):
+        self.diffeq = diffeq
+        self.n_sets = len(X)
+        self._x = tuple(np.ascontiguousarray(X.T))
+        self._v = np.zeros((diffeq.n_reactions+1, self.n_sets))
+        S = [diffeq.stoichiometry(x) for x in X]
+        if all(np.array_equal(S[0], S_k) for S_k in S[1:]):
+            self._stoichiometric_matrix = S[0]
+            self._stoichiometric_matrices = None
+        else:
+            self._stoichiometric_matrix = None
+            self._stoichiometric_matrices = np.array(S)
+        self._inputs = getattr(diffeq, 'inputs', None)
+
+    def __call__(self, t, y, args=None):
+        y = y.reshape(self.n_sets, -1).T
+        # The method of the class, in case flux of diffeq is compiled for a
+        # single parameter set.
+        v = type(self.diffeq).flux(self.diffeq, t, y, self._x, self._v)
+
+        if self.diffeq.perturbation:
+            for i, dv in self.diffeq.perturbation.items():
+                v[i] = v[i] * dv
+
+        if self._stoichiometric_matrices is None:
+            dydt = self._stoichiometric_matrix.dot(v)
+        else:
+            dydt = np.einsum('kij,jk->ik', self._stoichiometric_matrices, v)
+        if self._inputs is not None:
+            dydt = self._inputs(t, self._x, dydt)
+
+        return dydt.T.ravel()
+
+
+class _EnsembleJacobian(object):
+    """Analytic Jacobian of the ensemble in the banded storage of LSODA,
+    band[i - j + n_species - 1, k*n_species + j] = J_k[i, j] for member k.
+    """
+    def __init__(self, jac, rhs):
+        self.jac = jac
+        self.rhs = rhs
+        n_species = jac.n_species
+        (self._i, self._j) = [
+            idx.ravel() for idx in np.indices((n_species, n_species))
+        ]
+        self._dvdy = np.zeros(
+            (rhs.n_sets, jac.diffeq.n_reactions+1, n_species)
+        )
+        self._band = np.zeros((2*n_species-1, rhs.n_sets*n_species))
+
+    def __call__(self, t, y, args=None):
+        y = y.reshape(self.rhs.n_sets, -1).T
+        dvdy = self._dvdy
+        for (row, col, value) in zip(
+                self.jac.rows, self.jac.cols,
+                self.jac._func(t, y, self.rhs._x)):
+            dvdy[:, row, col] = value
+
+        if self.jac.diffeq.perturbation:
+            for i, dv in self.jac.diffeq.perturbation.items():
+                dvdy[:, i] = dvdy[:, i] * dv
+
+        if self.rhs._stoichiometric_matrices is None:
+            J = np.matmul(self.rhs._stoichiometric_matrix, dvdy)
+        else:
+            J = np.matmul(self.rhs._stoichiometric_matrices, dvdy)
+        n_species = J.shape[1]
+        band = self._band.reshape(2*n_species-1, self.rhs.n_sets, n_species)
+        band[self._i - self._j + n_species - 1, :, self._j] = \
+            J[:, self._i, self._j].T
+
+        return self._band
+
+
+def solve_ensemble(
+        diffeq,
+        Y0,
+        tspan,
+        X,
+        jac=None,
+        rtol=1e-9,
+        atol=1e-9,
+        min_step=1e-8,
+        max_steps=100000,
+        breakpoints=(),
+        method='lsoda',
+        nonnegative=False,
+        max_evals=None,
+        max_time=None,
+        min_value=None,
+        check_finite=False
+):
+    """Integrate a model for an ensemble of parameter sets in a single call.
+
+    The members are integrated together as one system by LSODA with a
+    banded Jacobian, so the Python overhead of every step is shared by the
+    whole ensemble. If the ensemble fails, e.g., because of a single
+    pathological member, it is split in halves, down to single members,
+    which are integrated with solve_ode like in simulate.
+
+    The model must express diffeq.diffeq(t, y, x) as
+    stoichiometry(x) @ flux(t, y, x, v), followed by
+    inputs(t, x, dydt) if the model defines it, and both flux and inputs
+    must accept rows over the ensemble in place of scalars.
+
+    Parameters
+    ----------
+    diffeq : DifferentialEquation
+        Instance of the model's DifferentialEquation (or its subclass).
+
+    Y0 : array_like
+        Initial conditions of shape (n_sets, n_species). Members with
+        non-finite initial conditions are not integrated.
+
+    tspan : array_like
+        Monotonic time points at which the solution is returned.
+
+    X : array_like
+        Parameter sets of shape (n_sets, n_params).
+
+    jac : biomass.solver.jacobian.Jacobian, optional
+        Analytic Jacobian of diffeq, evaluated for all members at once.
+        Otherwise, LSODA approximates the banded Jacobian by finite
+        differences.
+
+    method : str
+        Integrator of the members integrated one by one (see solve_ode).
+
+    nonnegative, max_evals, max_time, min_value, check_finite
+        See solve_ode. The limits apply to each integration, and a member
+        that exceeds them on its own fails.
+
+    Returns
+    -------
+    Y : numpy array
+        Solutions of shape (n_sets, len(tspan), n_species). NaN for the
+        members that failed.
+
+    """
+    t = np.asarray(tspan, dtype=float)
+    Y0 = np.asarray(Y0, dtype=float)
+    X = np.asarray(X, dtype=float)
+    Y = np.full((len(Y0), len(t), Y0.shape[1]), np.nan)
+    members = np.flatnonzero(np.all(np.isfinite(Y0), axis=1))
+    options = dict(
+        rtol=rtol, atol=atol, min_step=min_step, max_steps=max_steps,
+        breakpoints=breakpoints, nonnegative=nonnegative,
+        max_evals=max_evals, max_time=max_time, min_value=min_value,
+        check_finite=check_finite
+    )
+    stack = [members] if len(members) > 0 else []
+    while stack:
+        members = stack.pop()
+        if len(members) == 1:
+            (k,) = members
+            try:
+                (T, Y_k) = solve_ode(
+                    diffeq.diffeq, Y0[k], t,
+                    ParameterSet(X[k], diffeq.stoichiometry(X[k])), jac=jac,
+                    method=method, **options
+                )
+            except BudgetExceeded:
+                continue
+            if T[-1] == t[-1]:
+                Y[k] = Y_k
+        elif not _integrate(diffeq, Y0, t, X, jac, members, Y, **options):
+            # A failure of any member stops the whole ensemble.
+            stack.extend(np.array_split(members, 2))
+
+    return Y
+
+
+def _integrate(diffeq, Y0, t, X, jac, members, Y, rtol, atol, min_step,
+               max_steps, breakpoints, nonnegative, max_evals, max_time,
+               min_value, check_finite):
+    n_species = Y0.shape[1]
+    tcrit = [b for b in breakpoints if t[0] < b <= t[-1]]
+    rhs = _EnsembleRHS(diffeq, X[members])
+    jac = None if jac is None else _EnsembleJacobian(jac, rhs)
+    if nonnegative:
+        rhs = _nonnegative(rhs)
+        jac = None if jac is None else _nonnegative(jac)
+    if max_evals is not None or max_time is not None \
+            or min_value is not None or check_finite:
+        rhs = _budget(rhs, max_evals, max_time, min_value, check_finite)
+    try:
+        with _fortran_lock:
+            (solution, info) = odeint(
+                rhs, Y0[members].ravel(), t, args=(None,), Dfun=jac,
+                tfirst=True, rtol=rtol, atol=atol, hmin=min_step,
+                mxstep=max_steps,
+                ml=n_species-1, mu=n_species-1,
+                tcrit=np.array(tcrit) if tcrit else None, full_output=True
+            )
+    except BudgetExceeded:
+        return False
+    if info['message'] != 'Integration successful.':
+        return False
+    Y[members] = solution.reshape(len(t), len(members), n_species) \
+        .transpose(1, 0, 2)
+
+    return True
@@ -0,0 +1,278 @@
+import threading
+import time
+
+import numpy as np
+from scipy.integrate import ode, odeint, solve_ivp
+from scipy.sparse import issparse
+
+# ODEPACK and VODE keep their state in Fortran common blocks and are not
+# reentrant.
+_fortran_lock = threading.Lock()
+
+
+# The wrappers below take args explicitly: f2py passes VODE's f_params only
+# to callbacks whose argument count matches.
+
+
+def _nonnegative(func):
+    def clipped(t, y, args):
+        value = func(t, y, args)
+        if np.all(np.isfinite(value.data if issparse(value) else value)):
+            return value
+        return func(t, np.maximum(y, 0.), args)
+
+    return clipped
+
+
+def _dense(jac):
+    """jac for the integrators that factorize dense matrices only.
+    """
+    if jac is None:
+        return None
+
+    def dense(t, y, args):
+        value = jac(t, y, args)
+        return value.toarray() if issparse(value) else value
+
+    return dense
+
+
+class BudgetExceeded(Exception):
+    """The integration was aborted by the limits given to solve_ode.
+    """
+
+
+def _budget(func, max_evals, max_time, min_value, check_finite):
+    deadline = None
+    n_evals = 0
+
+    def limited(t, y, args):
+        nonlocal deadline, n_evals
+        n_evals += 1
+        if max_time is not None and deadline is None:
+            # The clock starts at the first evaluation, i.e., once the
+            # integrator holds _fortran_lock, so that waiting for the
+            # integrations of other threads does not count.
+            deadline = time.perf_counter() + max_time
+        if max_evals is not None and n_evals > max_evals:
+            raise BudgetExceeded(
+                'More than {:d} evaluations of diffeq'.format(max_evals)
+            )
+        if deadline is not None and time.perf_counter() > deadline:
+            raise BudgetExceeded(
+                'Integration took longer than {:g} s'.format(max_time)
+            )
+        if min_value is not None and np.min(y) < min_value:
+            raise BudgetExceeded(
+                'State fell below {:g} at t = {:g}'.format(min_value, t)
+            )
+        value = func(t, y, args)
+        if check_finite and not np.all(np.isfinite(value)):
+            raise BudgetExceeded('diffeq is not finite at t = {:g}'.format(t))
+        return value
+
+    return limited
+
+
+def _lsoda(diffeq, t, y0, args, jac, rtol, atol, min_step, max_steps,
+           breakpoints):
+    tcrit = [b for b in breakpoints if t[0] < b <= t[-1]]
+    with _fortran_lock:
+        (Y, info) = odeint(
+            diffeq, y0, t, args=(args,), Dfun=_dense(jac), tfirst=True,
+            rtol=rtol, atol=atol, hmin=min_step, mxstep=max_steps,
+            tcrit=np.array(tcrit) if tcrit else None, full_output=True
+        )
+    if info['message'] != 'Integration successful.':
+        # Rows after the failure are not filled in by odeint.
+        return t[:1], np.array(y0, dtype=float, ndmin=2)
+
+    return t, Y
+
+
+def _vode(diffeq, t, y0, args, jac, rtol, atol, min_step, max_steps,
+          breakpoints):
+    # VODE has no critical points; it is restarted at every breakpoint.
+    restarts = set(b for b in breakpoints if t[0] < b < t[-1])
+    grid = np.union1d(t, list(restarts))
+    output = np.isin(grid, t)
+    Y = np.empty((len(t), len(y0)))
+    Y[0] = y0
+    with _fortran_lock:
+        sol = ode(diffeq, _dense(jac))
+        sol.set_integrator(
+            'vode', method='bdf', with_jacobian=True, rtol=rtol, atol=atol,
+            min_step=min_step, nsteps=max_steps
+        )
+        sol.set_initial_value(y0, t[0])
+        sol.set_f_params(args)
+        sol.set_jac_params(args)
+        n = 1
+        for (i, t_next) in enumerate(grid[1:], start=1):
+            sol.integrate(t_next)
+            if not sol.successful():
+                return t[:n], Y[:n]
+            if output[i]:
+                Y[n] = sol.y
+                n += 1
+            if t_next in restarts:
+                sol.set_initial_value(sol.y, t_next)
+
+    return t, Y
+
+
+def _solve_ivp(method):
+    def integrate(diffeq, t, y0, args, jac, rtol, atol, min_step, max_steps,
+                  breakpoints):
+        # Radau and BDF are restarted at every breakpoint.
+        edges = [t[0]] + [b for b in breakpoints if t[0] < b < t[-1]] \
+            + [t[-1]]
+        Y = np.empty((len(t), len(y0)))
+        Y[0] = y0
+        y = np.array(y0, dtype=float)
+        n = 1
+        for (start, end) in zip(edges[:-1], edges[1:]):
+            t_eval = t[(t > start) & (t <= end)]
+            sol = solve_ivp(
+                diffeq, (start, end), y, method=method,
+                t_eval=np.append(t_eval[t_eval < end], end),
+                args=(args,), jac=jac, rtol=rtol, atol=atol
+            )
+            if sol.status != 0:
+                return t[:n], Y[:n]
+            Y[n:n+len(t_eval)] = sol.y[:, :len(t_eval)].T
+            n += len(t_eval)
+            y = sol.y[:, -1]
+
+        return t, Y
+
+    return integrate
+
+
+methods = {
+    'lsoda': _lsoda,
+    'vode': _vode,
+    'radau': _solve_ivp('Radau'),
+    'bdf': _solve_ivp('BDF'),
+}
+""" Available integrators by name. Other integrators, e.g., JIT-compiled
+ones, can be registered here with the signature
+integrate(diffeq, t, y0, args, jac, rtol, atol, min_step, max_steps,
+breakpoints) -> (T, Y).
+"""
+
+
+def solve_ode(
+        diffeq,
+        y0,
+        tspan,
+        args,
+        jac=None,
+        rtol=1e-9,
+        atol=1e-9,
+        min_step=1e-8,
+        max_steps=100000,
+        breakpoints=(),
+        method='lsoda',
+        nonnegative=False,
+        max_evals=None,
+        max_time=None,
+        min_value=None,
+        check_finite=False
+):
+    """Integrate diffeq over the whole of tspan in a single call.
+
+    The integrator steps freely over the interval and interpolates the
+    solution at every time point in tspan, so there is no per-output-point
+    restart.
+
+    Parameters
+    ----------
+    diffeq : callable
+        diffeq(t, y, args)
+
+    y0 : array_like
+        Initial condition.
+
+    tspan : array_like
+        Monotonic time points at which the solution is returned, starting at
+        the initial time.
+
+    args : tuple
+        Model parameters passed to diffeq and jac.
+
+    jac : callable, optional
+        jac(t, y, args), e.g., from biomass.solver.get_jacobian.
+
+    max_steps : int
+        Maximum number of internal steps between two consecutive time points
+        of tspan, which may lie far apart (e.g., in fitting mode).
+
+    breakpoints : sequence of float
+        Time points at which diffeq is discontinuous, e.g., piecewise-constant
+        inputs. They are passed to LSODA as critical points (the other
+        integrators are restarted there), so that no step crosses a
+        breakpoint and the integration continues from the state at the
+        breakpoint instead of locating the jump by step rejections.
+
+    method : str
+        'lsoda' (scipy.integrate.odeint), 'vode' (scipy.integrate.ode, BDF),
+        'radau' or 'bdf' (scipy.integrate.solve_ivp), or any other key of
+        biomass.solver.integrate.methods. min_step and max_steps are ignored
+        by 'radau' and 'bdf'.
+
+    nonnegative : bool
+        If True and diffeq or jac is not finite at y, e.g., because round-off
+        below zero (-1e-28) gives NaN in a Hill function, it is evaluated
+        again at max(y, 0). Clipping every evaluation would instead remove
+        the restoring force of the decay terms at zero.
+
+    max_evals : int, optional
+        Maximum number of evaluations of diffeq.
+
+    max_time : float, optional
+        Maximum wall time of the integration in seconds, from the first
+        evaluation of diffeq on, so that waiting for the integrations of
+        other threads does not count.
+
+    min_value : float, optional
+        Lower bound of the states, e.g., -1e-6 for concentrations.
+
+    check_finite : bool
+        If True, non-finite values of diffeq (after nonnegative) abort the
+        integration instead of making the integrator reduce its step until
+        it fails.
+
+    Returns
+    -------
+    T : numpy array
+        Time points. T[-1] < tspan[-1] if the integration failed.
+
+    Y : numpy array
+        Solution of shape (len(T), len(y0)).
+
+    Raises
+    ------
+    BudgetExceeded
+        If any of max_evals, max_time, min_value and check_finite is
+        violated, so that pathological parameter sets fail fast rather than
+        after max_steps.
+
+    """
+    if method not in methods:
+        raise ValueError(
+            "Available methods are: {}".format(
+                ', '.join("'{}'".format(name) for name in methods)
+            )
+        )
+    t = np.asarray(tspan, dtype=float)
+    if nonnegative:
+        diffeq = _nonnegative(diffeq)
+        jac = None if jac is None else _nonnegative(jac)
+    if max_evals is not None or max_time is not None \
+            or min_value is not None or check_finite:
+        diffeq = _budget(diffeq, max_evals, max_time, min_value, check_finite)
+
+    return methods[method](
+        diffeq, t, y0, args, jac, rtol, atol, min_step, max_steps, breakpoints
+    )
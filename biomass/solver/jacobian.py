@@ -0,0 +1,188 @@
+import numpy as np
+from scipy.sparse import csc_matrix
+
+try:
+    import sympy
+except ImportError:  # analytic Jacobian is optional
+    sympy = None
+
+
+_flux_jacobians = {}
+
+
+def _derive_flux_jacobian(diffeq, n_species, n_params):
+    """Differentiate the rate equations of a model symbolically.
+
+    Returns
+    -------
+    rows, cols : numpy array
+        Indices of the structurally nonzero entries of dv/dy.
+
+    func : callable
+        func(t, y, x) returns the values of these entries.
+
+    """
+    t = sympy.Symbol('t')
+    y = sympy.symbols('y0:{:d}'.format(n_species))
+    x = sympy.symbols('x0:{:d}'.format(n_params))
+    v = [0] * (diffeq.n_reactions + 1)
+    type(diffeq).flux(diffeq, t, y, x, v)
+
+    rows = []
+    cols = []
+    exprs = []
+    for i, rate in enumerate(v):
+        # (a*b)**n -> a**n*b**n and powsimp keep the derivatives in the
+        # form a**(n-1) instead of a**n/a, which is 0/0 at a = 0.
+        rate = sympy.expand_power_base(sympy.sympify(rate), force=True)
+        for j in sorted(rate.free_symbols & set(y), key=y.index):
+            rows.append(i)
+            cols.append(y.index(j))
+            exprs.append(sympy.powsimp(sympy.diff(rate, j)))
+    func = sympy.lambdify((t, y, x), exprs, modules='numpy', cse=True)
+
+    return np.array(rows, dtype=int), np.array(cols, dtype=int), func
+
+
+class Jacobian(object):
+    """Analytic Jacobian of dydt = S @ v, i.e., J = S @ dv/dy.
+
+    Terms of diffeq that are not expressed through flux (e.g., time-dependent
+    inputs) must not depend on y.
+
+    Attributes
+    ----------
+    sparsity : scipy.sparse.csc_matrix
+        Structurally nonzero entries of J, i.e., J[i, j] != 0 only if a
+        reaction that changes species i has a rate that depends on species
+        j. Coefficients of S that vanish both for parameter values of 1 and
+        for random ones are taken as structural zeros.
+
+    sparse : bool
+        If True, J is returned as a scipy.sparse.csc_matrix with the
+        structure of sparsity.
+    """
+    def __init__(self, diffeq, n_species, n_params, sparse=False):
+        self.diffeq = diffeq
+        self.n_species = n_species
+        self.n_params = n_params
+        self.sparse = sparse
+        self._load()
+        self._dvdy = np.zeros((diffeq.n_reactions+1, n_species))
+        self._structure()
+
+    def _structure(self):
+        S = np.zeros((self.n_species, self.diffeq.n_reactions+1), dtype=bool)
+        for x in [
+                np.ones(self.n_params),
+                np.random.default_rng(0).uniform(0.5, 2., self.n_params)]:
+            S |= self.diffeq.stoichiometry(x) != 0
+        # J[i, cols[k]] += S[i, rows[k]] * dvdy[rows[k], cols[k]]
+        (self._i, self._k) = np.nonzero(S[:, self.rows])
+        # Positions of the coefficients S[i, rows[k]] in S.ravel()
+        self._coefficient_index = self._i * S.shape[1] + self.rows[self._k]
+        j = self.cols[self._k]
+        self.sparsity = csc_matrix(
+            (np.ones(len(j), dtype=bool), (self._i, j)),
+            shape=(self.n_species, self.n_species)
+        )
+        self.sparsity.sort_indices()
+        # Entries of csc_matrix are ordered by column, then by row.
+        (rows, cols) = self.sparsity.nonzero()
+        keys = np.sort(cols * self.n_species + rows)
+        self._position = np.searchsorted(keys, j * self.n_species + self._i)
+
+    def _load(self):
+        key = type(self.diffeq)
+        if key not in _flux_jacobians:
+            _flux_jacobians[key] = _derive_flux_jacobian(
+                self.diffeq, self.n_species, self.n_params
+            )
+        (self.rows, self.cols, self._func) = _flux_jacobians[key]
+
+    def __getstate__(self):
+        # Functions generated by lambdify cannot be pickled; they are
+        # derived again (once per process) when unpickled.
+        state = self.__dict__.copy()
+        del state['_func']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load()
+
+    def _stoichiometry(self, x):
+        # Built once per integration if x is a biomass.solver.ParameterSet.
+        S = getattr(x, 'stoichiometric_matrix', None)
+
+        return self.diffeq.stoichiometry(x) if S is None else S
+
+    def __call__(self, t, y, x):
+        if self.sparse:
+            return self._sparse(t, y, x)
+        dvdy = self._dvdy
+        dvdy[self.rows, self.cols] = self._func(t, y, x)
+
+        if self.diffeq.perturbation:
+            for i, dv in self.diffeq.perturbation.items():
+                dvdy[i] = dvdy[i] * dv
+
+        return self._stoichiometry(x).dot(dvdy)
+
+    def _sparse(self, t, y, x):
+        dvdy = np.array(self._func(t, y, x), dtype=float)
+
+        if self.diffeq.perturbation:
+            for i, dv in self.diffeq.perturbation.items():
+                dvdy[self.rows == i] *= dv
+
+        coefficients = self._stoichiometry(x).take(self._coefficient_index)
+        data = np.bincount(
+            self._position, weights=coefficients * dvdy[self._k],
+            minlength=self.sparsity.nnz
+        )
+
+        return csc_matrix(
+            (data, self.sparsity.indices, self.sparsity.indptr),
+            shape=self.sparsity.shape
+        )
+
+
+def get_jacobian(diffeq, n_species, n_params, sparse=False):
+    """Return the analytic Jacobian of diffeq.diffeq(t, y, x).
+
+    The symbolic derivation runs once per model (class of diffeq) and process.
+    None is returned if SymPy is not installed or the model does not define
+    its kinetics through flux and stoichiometry, in which case the integrator
+    falls back to finite differences.
+
+    Parameters
+    ----------
+    diffeq : DifferentialEquation
+        Instance of the model's DifferentialEquation (or its subclass).
+
+    n_species : int
+        V.NUM
+
+    n_params : int
+        C.NUM
+
+    sparse : bool
+        If True, jac returns a scipy.sparse.csc_matrix, which the 'radau'
+        and 'bdf' integrators factorize by sparse LU decomposition. Pays off
+        for models with hundreds of species.
+
+    Returns
+    -------
+    jac : callable or None
+        jac(t, y, x) -> numpy array of shape (n_species, n_species)
+
+    """
+    if sympy is None:
+        return None
+    if not all(
+            hasattr(diffeq, attr)
+            for attr in ['flux', 'stoichiometry', 'n_reactions']):
+        return None
+
+    return Jacobian(diffeq, n_species, n_params, sparse)
@@ -0,0 +1,144 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # JIT compilation is optional
+    numba = None
+try:
+    import sympy
+except ImportError:
+    sympy = None
+
+_compiled_fluxes = {}
+
+
+def _flux_source(diffeq, n_species, n_params):
+    """Python source of flux(t, y, x, v) with the rate equations of a model
+    written out as scalar arithmetic, which Numba compiles in nopython mode.
+    """
+    t = sympy.Symbol('t')
+    y = [sympy.Symbol('y[{:d}]'.format(i)) for i in range(n_species)]
+    x = [sympy.Symbol('x[{:d}]'.format(i)) for i in range(n_params)]
+    v = [0] * (diffeq.n_reactions + 1)
+    # The method of the class, in case flux of diffeq is already compiled.
+    type(diffeq).flux(diffeq, t, y, x, v)
+    (temporaries, rates) = sympy.cse(
+        [sympy.sympify(rate) for rate in v],
+        symbols=sympy.numbered_symbols('_c')
+    )
+    lines = ['import math', '', '', 'def flux(t, y, x, v):']
+    lines += [
+        '    {} = {}'.format(symbol, sympy.pycode(expr))
+        for (symbol, expr) in temporaries
+    ]
+    lines += [
+        '    v[{:d}] = {}'.format(i, sympy.pycode(rate))
+        for (i, rate) in enumerate(rates)
+    ]
+    lines += ['', '    return v', '']
+
+    return '\n'.join(lines)
+
+
+def _load(name, path):
+    if name not in sys.modules:
+        # Numba looks the module up by name when loading cached code.
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+
+    return CompiledFlux(
+        name, path, numba.njit(cache=True)(sys.modules[name].flux)
+    )
+
+
+class CompiledFlux(object):
+    """flux(t, y, x, v) compiled with Numba.
+
+    x is passed as a float array, so the compiled function is specialized
+    for a single signature. The array is built once per integration if x is
+    a biomass.solver.ParameterSet.
+    """
+    def __init__(self, name, path, func):
+        self.name = name
+        self.path = path
+        self._func = func
+
+    def __call__(self, t, y, x, v):
+        x_array = getattr(x, 'array', None)
+        if x_array is None:
+            x_array = np.array(x, dtype=float)
+        return self._func(
+            float(t), np.asarray(y, dtype=float), x_array, v
+        )
+
+    def __reduce__(self):
+        # Workers load the compiled function from the on-disk cache.
+        return _load, (self.name, self.path)
+
+
+def jit_compile(diffeq, n_species, n_params):
+    """Replace diffeq.flux with a version compiled by Numba.
+
+    The source of the compiled function is generated from the rate
+    equations once per model and written to
+    __pycache__/jit/flux.py in the directory of the model. Numba caches the
+    machine code next to it, so other processes (e.g., pool workers) and
+    later runs load it instead of compiling it again.
+
+    Parameters
+    ----------
+    diffeq : DifferentialEquation
+        Instance of the model's DifferentialEquation (or its subclass).
+
+    n_species : int
+        V.NUM
+
+    n_params : int
+        C.NUM
+
+    Returns
+    -------
+    compiled : bool
+        False if Numba or SymPy is not installed, the model does not define
+        its kinetics through flux, or the cache directory is not writable,
+        in which case flux stays interpreted.
+
+    """
+    if numba is None or sympy is None:
+        return False
+    if not hasattr(diffeq, 'flux') or not hasattr(diffeq, 'n_reactions'):
+        return False
+    key = type(diffeq)
+    if key not in _compiled_fluxes:
+        model_dir = os.path.dirname(
+            os.path.abspath(sys.modules[key.__module__].__file__)
+        )
+        path = os.path.join(model_dir, '__pycache__', 'jit', 'flux.py')
+        source = _flux_source(diffeq, n_species, n_params)
+        try:
+            with open(path) as f:
+                updated = f.read() != source
+        except OSError:
+            updated = True
+        try:
+            if updated:
+                # Written atomically, as workers may compile concurrently.
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.{:d}'.format(os.getpid()), 'w') as f:
+                    f.write(source)
+                os.replace(path + '.{:d}'.format(os.getpid()), path)
+        except OSError:
+            return False
+        _compiled_fluxes[key] = _load(
+            'biomass_jit_' + key.__module__.replace('.', '_'), path
+        )
+    compiled = _compiled_fluxes[key]
+    diffeq.flux = CompiledFlux(compiled.name, compiled.path, compiled._func)
+
+    return True
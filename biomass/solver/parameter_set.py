@@ -0,0 +1,38 @@
+import numpy as np
+
+
+class ParameterSet(tuple):
+    """Parameter values of an integration, with what diffeq and jac derive
+    from them.
+
+    It is the tuple of values indexed by flux, and it cannot be modified, so
+    the stoichiometric matrix and the float array of the values are built
+    once when the integration starts rather than at every evaluation of
+    diffeq and jac. These fall back to deriving them from plain tuples or
+    lists.
+
+    Parameters
+    ----------
+    x : array_like
+        Parameter values.
+
+    stoichiometric_matrix : numpy array
+        stoichiometry(x) of the model.
+
+    Attributes
+    ----------
+    stoichiometric_matrix : numpy array
+
+    array : numpy array
+        x as floats, e.g., for compiled flux.
+
+    """
+    def __new__(cls, x, stoichiometric_matrix):
+        self = super().__new__(cls, x)
+        self.stoichiometric_matrix = stoichiometric_matrix
+        self.array = np.array(self, dtype=float)
+
+        return self
+
+    def __reduce__(self):
+        return ParameterSet, (tuple(self), self.stoichiometric_matrix)
@@ -0,0 +1,256 @@
+import warnings
+
+import numpy as np
+from scipy.sparse import identity as sparse_identity, issparse
+from scipy.sparse.linalg import MatrixRankWarning, spsolve
+
+from .integrate import solve_ode
+
+
+class SteadyStateCache(object):
+    """Bounded cache of steady states for warm starts.
+
+    Parameter vectors are compared on a log scale, and the steady state of
+    the nearest one is used as the initial guess of the next equilibration.
+    When the cache is full, the least recently used entry is replaced.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of steady states kept.
+
+    Attributes
+    ----------
+    hits : int
+        Number of warm starts.
+
+    misses : int
+        Number of cold starts, i.e., the cache was empty or the warm start
+        did not converge.
+
+    """
+    def __init__(self, maxsize=128):
+        if maxsize < 1:
+            raise ValueError('maxsize must be a positive integer')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._keys = None
+        self._values = None
+        self._last_used = np.zeros(maxsize, dtype=int)  # 0: empty
+        self._clock = 0
+
+    @staticmethod
+    def _key(args):
+        return np.log10(np.abs(np.asarray(args, dtype=float)) + 1e-12)
+
+    def lookup(self, args):
+        """Return the steady state of the nearest parameter vector, or None.
+        """
+        if self._keys is None:
+            return None
+        filled = np.flatnonzero(self._last_used)
+        distance = np.sum((self._keys[filled] - self._key(args))**2, axis=1)
+        nearest = filled[np.argmin(distance)]
+        self._clock += 1
+        self._last_used[nearest] = self._clock
+
+        return self._values[nearest].copy()
+
+    def store(self, args, y_steady_state):
+        key = self._key(args)
+        if self._keys is None:
+            self._keys = np.empty((self.maxsize, len(key)))
+            self._values = np.empty((self.maxsize, len(y_steady_state)))
+        slot = np.argmin(self._last_used)
+        self._keys[slot] = key
+        self._values[slot] = y_steady_state
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def clear(self):
+        self._keys = None
+        self._values = None
+        self._last_used[:] = 0
+
+
+def _warm_start(y_guess, y0, stoichiometry):
+    """Move y_guess onto the conservation laws of y0, i.e., L @ y = L @ y0
+    for the left null space L of the stoichiometric matrix. Returns None if
+    the result is not nonnegative, since clipping it would break the
+    conservation laws again.
+    """
+    (_, sv, vt) = np.linalg.svd(stoichiometry.T)
+    rank = np.count_nonzero(sv > sv[0] * 1e-10)
+    conserved = vt[rank:]
+    correction = conserved.T.dot(conserved.dot(y_guess - y0))
+    # Round-off of the projection would add mass to species that are absent.
+    correction[np.abs(correction) < 1e-12 * np.max(np.abs(y0))] = 0.
+    y = y_guess - correction
+
+    return y if np.min(y) >= 0. else None
+
+
+def _is_steady(dydt, y, eps):
+    return np.max(np.abs(dydt / (y + eps))) < eps
+
+
+def _pseudo_transient(diffeq, y0, args, jac, eps, dt, max_iter, dt_min):
+    """Pseudo-transient continuation.
+
+    Each step is an implicit Euler step (I/dt - J) dy = f, so the iterates
+    follow the trajectory while dt is small and stay on the manifold of the
+    conservation laws, where the plain Newton matrix -J is singular. dt is
+    grown by switched evolution relaxation, dt *= |f_old| / |f_new|, and
+    the iteration becomes Newton's method as it converges.
+    """
+    y = np.array(y0, dtype=float)
+    f = np.array(diffeq(0., y, args), dtype=float)
+    for _ in range(max_iter):
+        if _is_steady(f, y, eps):
+            return y
+        J = jac(0., y, args)
+        if issparse(J):
+            with warnings.catch_warnings():
+                # Singular matrices give NaN, as handled below.
+                warnings.simplefilter('ignore', MatrixRankWarning)
+                dy = spsolve(
+                    (sparse_identity(len(y)) / dt - J).tocsc(), f
+                )
+        else:
+            try:
+                dy = np.linalg.solve(np.eye(len(y)) / dt - J, f)
+            except np.linalg.LinAlgError:
+                dy = np.full_like(y, np.nan)
+        y_new = y + dy
+        if np.all(np.isfinite(y_new)) and np.min(y_new) >= -eps:
+            # Round-off below zero gives NaN in fractional powers.
+            y_new = np.maximum(y_new, 0.)
+            f_new = np.array(diffeq(0., y_new, args), dtype=float)
+            if np.all(np.isfinite(f_new)):
+                dt *= np.linalg.norm(f) / max(np.linalg.norm(f_new), 1e-300)
+                (y, f) = (y_new, f_new)
+                continue
+        dt /= 10.
+        if dt < dt_min:
+            break
+
+    return None
+
+
+def _integrate(diffeq, y0, args, jac, eps, max_horizon):
+    """Integrate until the relative change over a unit of time drops below
+    eps. The horizon is doubled every time the state is not steady yet, up to
+    max_horizon.
+    """
+    y0 = np.array(y0, dtype=float)
+    horizon = 1
+    while horizon <= max_horizon:
+        (T, Y) = solve_ode(
+            diffeq, y0, range(horizon+1), args, jac=jac, nonnegative=True
+        )
+        if T[-1] < horizon:
+            return None
+        steady = np.max(
+            np.abs((Y[1:, :] - Y[:-1, :]) / (Y[:-1, :] + eps)), axis=1
+        ) < eps
+        if np.any(steady):
+            return Y[np.argmax(steady), :]
+        y0 = Y[-1, :]
+        horizon *= 2
+
+    return None
+
+
+def get_steady_state(
+        diffeq,
+        y0,
+        args,
+        jac=None,
+        eps=1e-6,
+        dt=1.,
+        max_iter=200,
+        dt_min=1e-8,
+        max_horizon=1e5,
+        cache=None,
+        stoichiometry=None
+):
+    """Find the steady state reached from y0.
+
+    With a Jacobian, the steady state is solved for directly by
+    pseudo-transient continuation (damped Newton). The model is integrated
+    only if jac is None or the iteration fails, i.e., it does not converge
+    within max_iter steps or the step size falls below dt_min.
+
+    Parameters
+    ----------
+    diffeq : callable
+        diffeq(t, y, args). The steady state is computed at t = 0.
+
+    y0 : array_like
+        Initial condition.
+
+    args : tuple
+        Model parameters passed to diffeq and jac.
+
+    jac : callable, optional
+        jac(t, y, args), e.g., from biomass.solver.get_jacobian.
+
+    eps : float
+        The state is steady if max(|dydt / (y + eps)|) < eps, i.e., the
+        relative change over a unit of time is smaller than eps.
+
+    dt : float
+        Initial pseudo-time step.
+
+    max_horizon : float
+        Longest interval over which the model is integrated at once, e.g.,
+        if it oscillates or drifts slowly.
+
+    cache : SteadyStateCache, optional
+        If given together with jac and stoichiometry, the iteration starts
+        from the cached steady state of the nearest parameter vector, and the
+        result is added to the cache.
+
+    stoichiometry : numpy array, optional
+        Stoichiometric matrix (species x reactions) for args. Used to keep
+        the warm start on the conservation laws of y0. Even so, the steady
+        state found may depend on the warm start, e.g., on the order in
+        which parameter vectors are evaluated, if the model has several
+        steady states within them or converges slowly.
+
+    Returns
+    -------
+    y_steady_state : list or None
+        None if the integration failed or the state was not steady within
+        max_horizon.
+
+    """
+    y_steady_state = None
+    warm = cache is not None and jac is not None and stoichiometry is not None
+    if warm:
+        y_guess = cache.lookup(args)
+        if y_guess is not None:
+            y_guess = _warm_start(
+                y_guess, np.asarray(y0, dtype=float), stoichiometry
+            )
+        if y_guess is not None:
+            y_steady_state = _pseudo_transient(
+                diffeq, y_guess, args, jac, eps, dt, max_iter, dt_min
+            )
+        if y_steady_state is None:
+            cache.misses += 1
+        else:
+            cache.hits += 1
+    if y_steady_state is None and jac is not None:
+        y_steady_state = _pseudo_transient(
+            diffeq, y0, args, jac, eps, dt, max_iter, dt_min
+        )
+    if y_steady_state is None:
+        y_steady_state = _integrate(diffeq, y0, args, jac, eps, max_horizon)
+    if y_steady_state is None:
+        return None
+    if warm:
+        cache.store(args, y_steady_state)
+
+    return y_steady_state.tolist()
@@ -6,7 +6,9 @@ import warnings
 
 from biomass.exec_model import ExecModel
 from biomass.dynamics import SignalingSystems
-from biomass.ga import GeneticAlgorithmInit, GeneticAlgorithmContinue
+from biomass.ga import (GeneticAlgorithmInit, GeneticAlgorithmContinue,
+                        Migration)
+from biomass.solver import calibrate_method, save_method
 from biomass.analysis import (ReactionSensitivity,
                               InitialConditionSensitivity,
                               ParameterSensitivity)
@@ -25,76 +27,36 @@ class OptimizationResults(ExecModel):
         optimization_results/optimized_initials.csv
         """
         os.makedirs(self.model_path + '/optimization_results/', exist_ok=True)
-        n_file = self.get_executable()
+        # All paramsets are read in a single query.
+        (n_file, best_indivs, best_fitness) = self.results.get_all()
+        n_params = len(self.sp.idx_params)
 
         if len(self.sp.idx_params) > 0:
-            optimized_params = np.empty(
-                (len(self.sp.idx_params)+2, len(n_file)+1), dtype='<U21'
+            self._write_table(
+                'optimized_params.csv',
+                [self.parameters[i] for i in self.sp.idx_params],
+                n_file, best_fitness, best_indivs[:, :n_params]
             )
-            for i, param_index in enumerate(self.sp.idx_params):
-                for j, nth_paramset in enumerate(n_file):
-                    best_generation = np.load(
-                        self.model_path + '/out/{:d}/generation.npy'.format(
-                            nth_paramset
-                        )
-                    )
-                    best_indiv = np.load(
-                        self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                            nth_paramset, int(best_generation)
-                        )
-                    )
-                    error = np.load(
-                        self.model_path + '/out/{:d}/best_fitness.npy'.format(
-                            nth_paramset
-                        )
-                    )
-                    optimized_params[0, 0] = ''
-                    optimized_params[1, 0] = '*Error*'
-                    optimized_params[i+2, 0] = self.parameters[param_index]
-                    optimized_params[0, nth_paramset-1] = str(nth_paramset)
-                    optimized_params[1, nth_paramset-1] = \
-                        '{:8.3e}'.format(error)
-                    optimized_params[i+2, nth_paramset-1] = \
-                        '{:8.3e}'.format(best_indiv[i])
-            with open(
-                    self.model_path
-                    + '/optimization_results/optimized_params.csv', 'w') as f:
-                writer = csv.writer(f, lineterminator='\n')
-                writer.writerows(optimized_params)
         if len(self.sp.idx_initials) > 0:
-            optimized_initials = np.empty(
-                (len(self.sp.idx_initials)+2, len(n_file)+1), dtype='<U21'
+            self._write_table(
+                'optimized_initals.csv',
+                [self.species[i] for i in self.sp.idx_initials],
+                n_file, best_fitness, best_indivs[:, n_params:]
             )
-            for i, specie_index in enumerate(self.sp.idx_initials):
-                for j, nth_paramset in enumerate(n_file):
-                    best_generation = np.load(
-                        self.model_path + '/out/{:d}/generation.npy'.format(
-                            nth_paramset
-                        )
-                    )
-                    best_indiv = np.load(
-                        self.model_path + '/out/{:d}/fit_param{:d}.npy'.format(
-                            nth_paramset, int(best_generation)
-                        )
-                    )
-                    error = np.load(
-                        self.model_path + '/out/{:d}/best_fitness.npy'.format(
-                            nth_paramset
-                        )
-                    )
-                    optimized_initials[0, 0] = ''
-                    optimized_initials[1, 0] = '*Error*'
-                    optimized_initials[i+2, 0] = self.species[specie_index]
-                    optimized_initials[0, nth_paramset-1] = str(nth_paramset)
-                    optimized_initials[1, nth_paramset-1] = \
-                        '{:8.3e}'.format(error)
-                    optimized_initials[i+2, nth_paramset-1] = \
-                        '{:8.3e}'.format(best_indiv[i+len(self.sp.idx_params)])
-            with open(
-                    self.model_path
-                    + '/optimization_results/optimized_initals.csv', 'w') as f:
-                writer = csv.writer(f, lineterminator='\n')
-                writer.writerows(optimized_initials)
+
+    def _write_table(self, filename, names, n_file, best_fitness, values):
+        table = np.empty((len(names)+2, len(n_file)+1), dtype='<U21')
+        table[0, 0] = ''
+        table[1, 0] = '*Error*'
+        table[2:, 0] = names
+        table[0, 1:] = [str(nth_paramset) for nth_paramset in n_file]
+        table[1, 1:] = np.char.mod('%8.3e', best_fitness)
+        table[2:, 1:] = np.char.mod('%8.3e', values.T)
+        with open(
+                self.model_path
+                + '/optimization_results/' + filename, 'w') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerows(table)
 
     def dynamic_assessment(self, include_original=False):
         with open(self.model_path + '/fitness_assessment.csv', mode='w') as f:
@@ -126,12 +88,36 @@ def run_simulation(model, viz_type, show_all=False, stdev=False):
     )
 
 
-def optimize(model, *args):
+def optimize(model, *args, backend='serial', n_workers=None,
+             tolerance_schedule=None, budget=None, migration=None,
+             asynchronous=False, cache=None):
     warnings.filterwarnings('ignore')
+    if len(args) == 2 and backend == 'process':
+        raise ValueError(
+            "backend='process' cannot be used when paramsets are optimized "
+            "in parallel"
+        )
+    if migration is not None and len(args) != 2:
+        raise ValueError(
+            'migration requires paramsets optimized in parallel'
+        )
+    elif migration is not None:
+        migration = Migration(
+            model.__path__[0] + '/out',
+            range(int(args[0]), int(args[1]) + 1), **migration
+        )
+        migration.clear()
     ga_init = GeneticAlgorithmInit(
         model,
         max_generation=10000,
-        allowable_error=0.5
+        allowable_error=0.5,
+        backend=backend,
+        n_workers=n_workers,
+        tolerance_schedule=tolerance_schedule,
+        budget=budget,
+        migration=migration,
+        asynchronous=asynchronous,
+        cache=cache
     )
     if len(args) == 1:
         ga_init.run(int(args[0]))
@@ -144,13 +130,37 @@ def optimize(model, *args):
         raise ValueError('too many values to unpack (expected 2)')
 
 
-def optimize_continue(model, *args):
+def optimize_continue(model, *args, backend='serial', n_workers=None,
+                      tolerance_schedule=None, budget=None, migration=None,
+                      asynchronous=False, cache=None):
     warnings.filterwarnings('ignore')
+    if len(args) == 2 and backend == 'process':
+        raise ValueError(
+            "backend='process' cannot be used when paramsets are optimized "
+            "in parallel"
+        )
+    if migration is not None and len(args) != 2:
+        raise ValueError(
+            'migration requires paramsets optimized in parallel'
+        )
+    elif migration is not None:
+        migration = Migration(
+            model.__path__[0] + '/out',
+            range(int(args[0]), int(args[1]) + 1), **migration
+        )
+        migration.clear()
     ga_continue = GeneticAlgorithmContinue(
         model,
         max_generation=10000,
         allowable_error=0.5,
-        p0_bounds=[0.1, 10.]  # [lower_bound, upper_bound]
+        p0_bounds=[0.1, 10.],  # [lower_bound, upper_bound]
+        backend=backend,
+        n_workers=n_workers,
+        tolerance_schedule=tolerance_schedule,
+        budget=budget,
+        migration=migration,
+        asynchronous=asynchronous,
+        cache=cache
     )
     if len(args) == 1:
         ga_continue.run(int(args[0]))
@@ -163,6 +173,32 @@ def optimize_continue(model, *args):
         raise ValueError('too many values to unpack (expected 2)')
 
 
+def calibrate_solver(model, candidates=None, tolerance=1e-4, n_repeat=3):
+    """ Time each integrator on the default parameters of the model and
+    record the fastest one within tolerance of a tight-tolerance reference
+    in model_path/solver.json. NumericalSimulation uses it from then on.
+
+    Returns
+    -------
+    report : dict
+        {method: {'time': seconds, 'error': relative deviation}}
+
+    """
+    warnings.filterwarnings('ignore')
+    exec_model = ExecModel(model)
+    (method, report) = calibrate_method(
+        exec_model.sim, exec_model.pval(), exec_model.ival(),
+        candidates, tolerance, n_repeat
+    )
+    if method is None:
+        raise ValueError(
+            'No integrator is accurate within {:e}'.format(tolerance)
+        )
+    save_method(exec_model.model_path, method, report)
+
+    return report
+
+
 def run_analysis(
         model,
         target,
@@ -0,0 +1,32 @@
+import numpy as np
+
+from biomass.models.mapk_cascade import (C, NumericalSimulation, V,
+                                         initial_values, param_values)
+from biomass.solver import solve_ensemble
+
+
+def test_simulate_ensemble():
+    x = np.array(param_values(), dtype=float)
+    rng = np.random.RandomState(0)
+    X = x * np.exp(rng.normal(scale=0.1, size=(4, len(x))))
+    X[2, C.V1] = np.nan  # fails within the ensemble
+    Y0 = np.tile(np.array(initial_values(), dtype=float), (len(X), 1))
+    Y0[3, V.MKKK] = np.nan  # not integrated
+    sim = NumericalSimulation()
+    simulations = sim.simulate_ensemble(X, Y0)
+    assert np.all(np.isnan(simulations[2:]))
+    for k in range(2):
+        assert sim.simulate(list(X[k]), list(Y0[k])) is not False
+        np.testing.assert_allclose(
+            simulations[k], sim.simulations, rtol=1e-4, atol=1e-6
+        )
+
+
+def test_budget():
+    sim = NumericalSimulation()
+    X = np.tile(param_values(), (2, 1))
+    Y0 = np.tile(initial_values(), (2, 1))
+    Y = solve_ensemble(sim, Y0, sim.t, X, jac=sim.jac, max_evals=10)
+    assert np.all(np.isnan(Y))
+    Y = solve_ensemble(sim, Y0, sim.t, X, jac=sim.jac, max_time=60.)
+    assert np.all(np.isfinite(Y))
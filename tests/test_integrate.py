@@ -0,0 +1,56 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from biomass.solver import BudgetExceeded, solve_ode
+from biomass.solver.integrate import _fortran_lock, methods
+
+
+def decay(t, y, x):
+    return -x[0] * y
+
+
+def test_vode_nonnegative():
+    (T, Y) = solve_ode(
+        decay, [1.], [0., 1., 2.], (1.,), method='vode', nonnegative=True
+    )
+    assert T[-1] == 2.
+    np.testing.assert_allclose(Y[:, 0], np.exp(-T), rtol=1e-6)
+
+
+def test_vode_jacobian():
+    (T, Y) = solve_ode(
+        decay, [1.], [0., 1., 2.], (1.,),
+        jac=lambda t, y, x: np.array([[-x[0]]]), method='vode'
+    )
+    assert T[-1] == 2.
+    np.testing.assert_allclose(Y[:, 0], np.exp(-T), rtol=1e-6)
+
+
+@pytest.mark.parametrize('method', sorted(methods))
+def test_budget(method):
+    with pytest.raises(BudgetExceeded):
+        solve_ode(
+            decay, [1.], [0., 1., 2.], (1.,), method=method, max_evals=5
+        )
+    with pytest.raises(BudgetExceeded):
+        solve_ode(
+            lambda t, y, x: np.full_like(y, np.nan), [1.], [0., 1.], (1.,),
+            method=method, check_finite=True
+        )
+
+
+def test_budget_excludes_waiting_for_the_lock():
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(
+            solve_ode(decay, [1.], [0., 1.], (1.,), max_time=0.2)
+        )
+    )
+    with _fortran_lock:
+        thread.start()
+        time.sleep(0.5)
+    thread.join()
+    assert result and result[0][0][-1] == 1.
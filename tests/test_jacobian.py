@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from biomass.models.Nakakuki_Cell_2010 import (C, DifferentialEquation, V,
+                                               initial_values, param_values)
+from biomass.solver import get_jacobian
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_parameters_modified_in_place(sparse):
+    x = param_values()
+    y = np.array(initial_values(), dtype=float) + 1.
+    jac = get_jacobian(
+        DifferentialEquation(perturbation={}), V.NUM, C.NUM, sparse=sparse
+    )
+    jac(0., y, x)
+    x[C.Vn] *= 2.
+    expected = get_jacobian(
+        DifferentialEquation(perturbation={}), V.NUM, C.NUM, sparse=sparse
+    )(0., y, x)
+    if sparse:
+        (actual, expected) = (jac(0., y, x).toarray(), expected.toarray())
+    else:
+        actual = jac(0., y, x)
+    np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,18 @@
+import numpy as np
+
+from biomass.solver import ParameterSet
+from biomass.solver.jit import CompiledFlux
+
+
+def test_parameters_modified_in_place():
+    flux = CompiledFlux(None, None, lambda t, y, x, v: x.copy())
+    x = [1., 2.]
+    flux(0., [0.], x, None)
+    x[0] = 3.
+    np.testing.assert_array_equal(flux(0., [0.], x, None), [3., 2.])
+
+
+def test_parameter_set():
+    flux = CompiledFlux(None, None, lambda t, y, x, v: x)
+    args = ParameterSet([1., 2.], None)
+    assert flux(0., [0.], args, None) is args.array
@@ -0,0 +1,63 @@
+import pickle
+
+import numpy as np
+
+from biomass.models.Nakakuki_Cell_2010 import (C, DifferentialEquation,
+                                               NumericalSimulation,
+                                               initial_values, param_values)
+from biomass.solver import ParameterSet
+
+
+def test_parameters_modified_in_place():
+    x = param_values()
+    y = np.array(initial_values(), dtype=float) + 1.
+    model = DifferentialEquation(perturbation={})
+    model.diffeq(0., y, x)
+    x[C.Vn] *= 2.
+    np.testing.assert_array_equal(
+        model.diffeq(0., y, x),
+        DifferentialEquation(perturbation={}).diffeq(0., y, x)
+    )
+
+
+def test_simulation_does_not_depend_on_history():
+    x = np.array(param_values(), dtype=float)
+    y0 = initial_values()
+    rng = np.random.RandomState(0)
+    (x_neighbour, x_target) = (
+        list(x * np.exp(rng.normal(scale=0.05, size=len(x))))
+        for _ in range(2)
+    )
+    sim = NumericalSimulation()
+    assert sim.simulate(x_neighbour, y0) is not False
+    assert sim.simulate(x_target, y0) is not False
+    simulations = sim.simulations.copy()
+    assert NumericalSimulation().simulate(x_target, y0) is not False
+    np.testing.assert_allclose(simulations, sim.simulations)
+
+
+def test_joint_conditions():
+    x = param_values()
+    y0 = initial_values()
+    sim = NumericalSimulation()
+    assert sim.simulate(x, y0) is not False
+    simulations = sim.simulations.copy()
+    sim.joint_conditions = True
+    assert sim.simulate(x, y0) is not False
+    assert x == param_values()
+    np.testing.assert_allclose(
+        sim.simulations, simulations, rtol=1e-4, atol=1e-6
+    )
+
+
+def test_parameter_set():
+    x = param_values()
+    y = np.array(initial_values(), dtype=float) + 1.
+    model = DifferentialEquation(perturbation={})
+    args = pickle.loads(
+        pickle.dumps(ParameterSet(x, model.stoichiometry(x)))
+    )
+    assert args == tuple(x)
+    np.testing.assert_array_equal(
+        model.diffeq(0., y, args), model.diffeq(0., y, x)
+    )
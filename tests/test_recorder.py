@@ -0,0 +1,28 @@
+from biomass.ga.recorder import RunRecorder
+from biomass.result_store import ResultStore
+
+
+class CountingStore(ResultStore):
+    def __init__(self, out_dir):
+        super().__init__(out_dir)
+        self.generations = []
+
+    def write(self, nth_paramset, count_num, best_fitness, improvements=[]):
+        self.generations.append(count_num)
+        super().write(nth_paramset, count_num, best_fitness, improvements)
+
+
+def test_flushes(tmp_path):
+    (tmp_path / '1').mkdir()
+    store = CountingStore(str(tmp_path))
+    recorder = RunRecorder(store, 1, flush_interval=100)
+    for generation in range(1, 301):
+        # Improvements in every generation up to 50, and once at 250
+        if generation <= 50:
+            best_fitness = 100. - generation
+        elif generation == 250:
+            best_fitness = 1.
+        recorder.record(generation, [best_fitness], best_fitness)
+    recorder.close()
+    assert store.generations == [1, 101, 201, 250, 300]
+    assert tuple(store.get(1)[1:]) == (1., 250, 300)
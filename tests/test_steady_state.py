@@ -0,0 +1,11 @@
+import numpy as np
+
+from biomass.solver import get_steady_state
+
+
+def oscillator(t, y, x):
+    return np.array([y[1], -x[0] * y[0]])
+
+
+def test_no_steady_state():
+    assert get_steady_state(oscillator, [1., 0.], (1e-2,)) is None